@@ -1,64 +1,153 @@
 """
 Configuration management for the heatmap worker.
+
+All settings are read from the environment once and exposed through the
+frozen ``CFG`` object, e.g. ``CFG.DB_HOST``.
 """
 
 import os
+import functools
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Mapping
 from dotenv import load_dotenv
 
-load_dotenv()
 
-# PostgreSQL Database Configuration
-# For direct connections (individual params)
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_PORT = int(os.getenv('DB_PORT', '5432'))
-DB_NAME = os.getenv('DB_NAME', 'postgres')
-DB_USER = os.getenv('DB_USER', '')
-DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+@functools.cache
+def load_env():
+    """Parse the .env file once per process; later calls are no-ops."""
+    load_dotenv(override=False)
+
+
+def _to_bool(value: str) -> bool:
+    return value.lower() == 'true'
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Typed, immutable snapshot of the worker configuration."""
+
+    # PostgreSQL Database Configuration
+    # For direct connections (individual params)
+    DB_HOST: str
+    DB_PORT: int
+    DB_NAME: str
+    DB_USER: str
+    DB_PASSWORD: str = field(repr=False)
+
+    # Alternative: Connection string (useful for Supabase pooler)
+    # Note: DB credentials are required for worker/processing scripts but not for S3-only scripts
+    DB_CONNECTION_STRING: str = field(repr=False)
+
+    # Connection pool sizing (shared by worker threads)
+    DB_POOL_MIN: int
+    DB_POOL_MAX: int
+
+    # PREPARE hot queries per connection (disable behind transaction-mode poolers)
+    DB_PREPARE_STATEMENTS: bool
+
+    # S3/Cloudflare R2 Configuration
+    S3_ENDPOINT_URL: str
+    S3_ACCESS_KEY: str
+    S3_SECRET_KEY: str = field(repr=False)
+    S3_BUCKET_NAME: str
+
+    # S3 Directory structure
+    S3_VIDEOS_PREFIX: str
+    S3_HEATMAPS_PREFIX: str
+
+    # Local storage
+    LOCAL_TEMP_DIR: str
+    LOCAL_DOWNLOADS_DIR: str
+    LOCAL_HEATMAPS_DIR: str
+
+    # Video processing
+    VIDEO_PREFIX: str
+    VIDEO_EXTENSION: str
+
+    # Heatmap settings
+    USE_BACKGROUND: bool
+    DOWNSCALE: float
+    # Store heatmaps as uint8 scaled to max_intensity (false = exact float32)
+    QUANTIZE_HEATMAPS: bool
+    # zlib level for stored heatmaps (1 = fastest, 9 = smallest)
+    COMPRESSION_LEVEL: int
+
+    # Hardware video decoding through FFmpeg (falls back to software)
+    VIDEO_HW_ACCELERATION: bool
+
+    # Background subtraction on the GPU (needs a CUDA build of OpenCV)
+    USE_CUDA: bool
+
+    # Worker settings
+    MAX_VIDEOS_PER_RUN: int
+    # Videos processed in parallel, one per process (1 = sequential)
+    WORKER_PROCESSES: int
+    CLEANUP_LOCAL_FILES: bool
 
-# Alternative: Connection string (useful for Supabase pooler)
-DB_CONNECTION_STRING = os.getenv('DATABASE_URL', '')
-# Note: DB credentials are required for worker/processing scripts but not for S3-only scripts
+    # Camera identification
+    CAMERA_ID: str
 
-# S3/Cloudflare R2 Configuration
-S3_ENDPOINT_URL = os.getenv(
-    'S3_ENDPOINT_URL',
-    'https://75ae5041529c1b7efc9e8196bbb9cf57.r2.cloudflarestorage.com'
-)
-S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY', '')
-S3_SECRET_KEY = os.getenv('S3_SECRET_KEY', '')
-S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'roz')
+    # Data retention
+    RETENTION_DAYS: int
 
-# S3 Directory structure
-S3_VIDEOS_PREFIX = os.getenv('S3_VIDEOS_PREFIX', 'raw_videos/')
-S3_HEATMAPS_PREFIX = os.getenv('S3_HEATMAPS_PREFIX', 'heatmaps/')
 
-# Local storage
-LOCAL_TEMP_DIR = os.getenv('LOCAL_TEMP_DIR', './temp')
-LOCAL_DOWNLOADS_DIR = os.path.join(LOCAL_TEMP_DIR, 'downloads')
-LOCAL_HEATMAPS_DIR = os.path.join(LOCAL_TEMP_DIR, 'heatmaps')
+def _read_config(environ: Mapping[str, str]) -> Config:
+    """Build a Config from an environment mapping."""
+    local_temp_dir = environ.get('LOCAL_TEMP_DIR', './temp')
 
-# Video processing
-VIDEO_PREFIX = os.getenv('VIDEO_PREFIX', '')
-VIDEO_EXTENSION = os.getenv('VIDEO_EXTENSION', '.mp4')
+    return Config(
+        DB_HOST=environ.get('DB_HOST', 'localhost'),
+        DB_PORT=int(environ.get('DB_PORT', '5432')),
+        DB_NAME=environ.get('DB_NAME', 'postgres'),
+        DB_USER=environ.get('DB_USER', ''),
+        DB_PASSWORD=environ.get('DB_PASSWORD', ''),
+        DB_CONNECTION_STRING=environ.get('DATABASE_URL', ''),
+        DB_POOL_MIN=int(environ.get('DB_POOL_MIN', '4')),
+        DB_POOL_MAX=int(environ.get('DB_POOL_MAX', '25')),
+        DB_PREPARE_STATEMENTS=_to_bool(
+            environ.get('DB_PREPARE_STATEMENTS', 'true')),
+        S3_ENDPOINT_URL=environ.get(
+            'S3_ENDPOINT_URL',
+            'https://75ae5041529c1b7efc9e8196bbb9cf57.r2.cloudflarestorage.com'
+        ),
+        S3_ACCESS_KEY=environ.get('S3_ACCESS_KEY', ''),
+        S3_SECRET_KEY=environ.get('S3_SECRET_KEY', ''),
+        S3_BUCKET_NAME=environ.get('S3_BUCKET_NAME', 'roz'),
+        S3_VIDEOS_PREFIX=environ.get('S3_VIDEOS_PREFIX', 'raw_videos/'),
+        S3_HEATMAPS_PREFIX=environ.get('S3_HEATMAPS_PREFIX', 'heatmaps/'),
+        LOCAL_TEMP_DIR=local_temp_dir,
+        LOCAL_DOWNLOADS_DIR=os.path.join(local_temp_dir, 'downloads'),
+        LOCAL_HEATMAPS_DIR=os.path.join(local_temp_dir, 'heatmaps'),
+        VIDEO_PREFIX=environ.get('VIDEO_PREFIX', ''),
+        VIDEO_EXTENSION=environ.get('VIDEO_EXTENSION', '.mp4'),
+        USE_BACKGROUND=_to_bool(environ.get('USE_BACKGROUND', 'true')),
+        DOWNSCALE=float(environ.get('DOWNSCALE', '0.25')),
+        QUANTIZE_HEATMAPS=_to_bool(environ.get('QUANTIZE_HEATMAPS', 'true')),
+        COMPRESSION_LEVEL=int(environ.get('COMPRESSION_LEVEL', '3')),
+        VIDEO_HW_ACCELERATION=_to_bool(
+            environ.get('VIDEO_HW_ACCELERATION', 'false')),
+        USE_CUDA=_to_bool(environ.get('USE_CUDA', 'false')),
+        MAX_VIDEOS_PER_RUN=int(environ.get('MAX_VIDEOS_PER_RUN', '10')),
+        WORKER_PROCESSES=int(environ.get('WORKER_PROCESSES', '1')),
+        CLEANUP_LOCAL_FILES=_to_bool(
+            environ.get('CLEANUP_LOCAL_FILES', 'true')),
+        CAMERA_ID=environ.get('CAMERA_ID', 'default'),
+        RETENTION_DAYS=int(environ.get('RETENTION_DAYS', '90')),
+    )
 
-# Heatmap settings
-USE_BACKGROUND = os.getenv('USE_BACKGROUND', 'true').lower() == 'true'
-DOWNSCALE = float(os.getenv('DOWNSCALE', '0.25'))
 
-# Worker settings
-MAX_VIDEOS_PER_RUN = int(os.getenv('MAX_VIDEOS_PER_RUN', '10'))
-CLEANUP_LOCAL_FILES = os.getenv(
-    'CLEANUP_LOCAL_FILES', 'true').lower() == 'true'
+@functools.lru_cache(maxsize=1)
+def _build_config() -> Config:
+    """Load .env and snapshot the environment into a Config (once)."""
+    load_env()
+    return _read_config(os.environ.copy())
 
-# Camera identification
-CAMERA_ID = os.getenv('CAMERA_ID', 'default')
 
-# Data retention
-RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '90'))
+CFG = _build_config()
 
 
 def ensure_directories():
     """Create necessary local directories if they don't exist."""
-    Path(LOCAL_DOWNLOADS_DIR).mkdir(parents=True, exist_ok=True)
-    Path(LOCAL_HEATMAPS_DIR).mkdir(parents=True, exist_ok=True)
+    Path(CFG.LOCAL_DOWNLOADS_DIR).mkdir(parents=True, exist_ok=True)
+    Path(CFG.LOCAL_HEATMAPS_DIR).mkdir(parents=True, exist_ok=True)
@@ -4,14 +4,47 @@ Handles listing, downloading, and uploading files to/from S3 (Cloudflare R2).
 """
 
 import os
-import boto3
+import re
+import threading
+import time
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from itertools import filterfalse
 from botocore.exceptions import ClientError
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Matches heatmap keys such as 'video_heatmap.jpg' (case-insensitive)
+_HEATMAP_PATTERN = re.compile(r'_heatmap\.', re.IGNORECASE)
+
+# Multipart transfer settings for large video files
+MULTIPART_THRESHOLD = 8 * 1024 * 1024  # 8 MB
+MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024  # 16 MB
+TRANSFER_MAX_CONCURRENCY = 16
+# Files transferred at once by the batch download/upload helpers. Uploads are
+# mostly small heatmap images (single PUTs), so they fan out much wider.
+BATCH_TRANSFER_WORKERS = 4
+BULK_UPLOAD_WORKERS = 50
+# Enough HTTP connections for bulk uploads, or for listing plus ranged transfers
+MAX_POOL_CONNECTIONS = 64
+
+# Full listings fan out across date sub-prefixes (YYYY/MM/DD) in parallel
+LIST_MAX_WORKERS = 16
+LIST_FANOUT_DEPTH = 3
+# Largest page list_objects_v2 will return
+LIST_PAGE_SIZE = 1000
+
+# HEAD results (object size, or None if missing) are reused for a short time
+HEAD_CACHE_TTL = 60  # seconds
+HEAD_CACHE_MAXSIZE = 10_000
+
+# Listing results are reused for repeated calls within a long-running process
+LIST_CACHE_TTL = 60  # seconds
+
 
 class S3Manager:
     """Manages interactions with S3/Cloudflare R2 storage."""
@@ -32,46 +65,106 @@ class S3Manager:
         self.bucket_name = bucket_name
         self.videos_prefix = videos_prefix
         self.heatmaps_prefix = heatmaps_prefix
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name='auto'  # Cloudflare R2 uses 'auto'
-        )
+        # When neither prefix contains the other, S3 already separates videos
+        # from heatmaps and listings can skip client-side classification
+        self._prefixes_overlap = (videos_prefix.startswith(heatmaps_prefix) or
+                                  heatmaps_prefix.startswith(videos_prefix))
+        # Local directories already created by download_file
+        self._created_dirs: Set[str] = set()
+        # cache key -> (expires_at, listed prefix, frozen listing result)
+        self._list_cache: Dict[tuple, Tuple[float, str, object]] = {}
+        # s3_key -> (expires_at, ContentLength or None if the object is missing)
+        self._head_cache: Dict[str, Tuple[float, Optional[int]]] = {}
+        # _head runs from many transfer/listing threads at once
+        self._head_cache_lock = threading.Lock()
+        # The boto3 client is built on first use (see s3_client)
+        self._s3_client = None
+        self._s3_client_lock = threading.Lock()
+        self._endpoint_url = endpoint_url
+        self._access_key = access_key
+        self._secret_key = secret_key
         logger.info(f"S3Manager initialized for bucket: {bucket_name}")
         logger.info(f"Videos prefix: {videos_prefix}")
         logger.info(f"Heatmaps prefix: {heatmaps_prefix}")
 
-    def list_videos(self, date_prefix: str = "", extension: str = ".mp4") -> List[str]:
+    @property
+    def s3_client(self):
+        """boto3 S3 client, created on first access.
+
+        boto3 is imported here so that scripts which never touch S3 don't pay
+        for loading botocore's service models and signers. The first access
+        may come from several worker threads at once, so creation is locked
+        and uses a private session (client creation on boto3's shared default
+        session isn't thread-safe, and cached_property no longer locks).
+        """
+        client = self._s3_client
+        if client is None:
+            with self._s3_client_lock:
+                if self._s3_client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    self._s3_client = boto3.session.Session().client(
+                        's3',
+                        endpoint_url=self._endpoint_url,
+                        aws_access_key_id=self._access_key,
+                        aws_secret_access_key=self._secret_key,
+                        region_name='auto',  # Cloudflare R2 uses 'auto'
+                        config=Config(max_pool_connections=MAX_POOL_CONNECTIONS)
+                    )
+                client = self._s3_client
+        return client
+
+    @cached_property
+    def _transfer_config(self):
+        """Split large transfers into parallel ranged GETs / multipart PUTs."""
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=TRANSFER_MAX_CONCURRENCY,
+            use_threads=True
+        )
+
+    def list_videos(self, date_prefix: str = "", extension: str = ".mp4",
+                    start_after: Optional[str] = None) -> List[str]:
         """
         List all video files in the bucket.
 
         Args:
             date_prefix: Optional date prefix to filter files (e.g., "2025/10/")
             extension: File extension to filter by (default: .mp4)
+            start_after: Optional key; only keys sorting after it are listed
 
         Returns:
             List of S3 keys for video files
         """
+        # Combine videos_prefix with date_prefix
+        full_prefix = f"{self.videos_prefix}{date_prefix}"
+        cache_key = ('videos', full_prefix, extension, start_after)
+        cached = self._get_cached_listing(cache_key)
+        if cached is not None:
+            return list(cached)
+
         try:
             video_files = []
-            paginator = self.s3_client.get_paginator('list_objects_v2')
 
-            # Combine videos_prefix with date_prefix
-            full_prefix = f"{self.videos_prefix}{date_prefix}"
+            if date_prefix or start_after:
+                keys = self._iter_keys(full_prefix, start_after)
+            else:
+                keys = self._list_keys_parallel(full_prefix)
 
-            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=full_prefix):
-                if 'Contents' not in page:
-                    continue
+            if self._prefixes_overlap:
+                keys = filterfalse(_HEATMAP_PATTERN.search, keys)
 
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    if key.endswith(extension) and not self._is_heatmap(key):
-                        video_files.append(key)
+            for key in keys:
+                if key.endswith(extension):
+                    video_files.append(key)
 
             logger.info(
                 f"Found {len(video_files)} video files with prefix '{full_prefix}'")
+            self._cache_listing(cache_key, full_prefix, tuple(video_files))
             return video_files
 
         except ClientError as e:
@@ -88,30 +181,213 @@ class S3Manager:
         Returns:
             List of S3 keys for heatmap files
         """
+        # Combine heatmaps_prefix with date_prefix
+        full_prefix = f"{self.heatmaps_prefix}{date_prefix}"
+        cache_key = ('heatmaps', full_prefix)
+        cached = self._get_cached_listing(cache_key)
+        if cached is not None:
+            return list(cached)
+
         try:
-            heatmap_files = []
-            paginator = self.s3_client.get_paginator('list_objects_v2')
+            keys = (self._iter_keys(full_prefix) if date_prefix
+                    else self._list_keys_parallel(full_prefix))
+            if self._prefixes_overlap:
+                keys = filter(_HEATMAP_PATTERN.search, keys)
+            heatmap_files = list(keys)
 
-            # Combine heatmaps_prefix with date_prefix
-            full_prefix = f"{self.heatmaps_prefix}{date_prefix}"
+            logger.info(
+                f"Found {len(heatmap_files)} heatmap files with prefix '{full_prefix}'")
+            self._cache_listing(cache_key, full_prefix, tuple(heatmap_files))
+            return heatmap_files
 
-            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=full_prefix):
-                if 'Contents' not in page:
-                    continue
+        except ClientError as e:
+            logger.error(f"Error listing heatmaps: {e}")
+            raise
+
+    def heatmap_video_keys(self, date_prefix: str = "") -> Set[str]:
+        """
+        Get the video keys that already have a heatmap.
 
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    if self._is_heatmap(key):
-                        heatmap_files.append(key)
+        Keys are mapped with get_video_key_for_heatmap while paginating, so
+        the heatmap listing itself is never materialized.
+
+        Args:
+            date_prefix: Optional date prefix to filter files (e.g., "2025/10/")
+
+        Returns:
+            Set of S3 keys for videos with heatmaps
+        """
+        full_prefix = f"{self.heatmaps_prefix}{date_prefix}"
+        cache_key = ('heatmap_video_keys', full_prefix)
+        cached = self._get_cached_listing(cache_key)
+        if cached is not None:
+            return set(cached)
+
+        try:
+            keys = (self._iter_keys(full_prefix) if date_prefix
+                    else self._list_keys_parallel(full_prefix))
+            if self._prefixes_overlap:
+                keys = filter(_HEATMAP_PATTERN.search, keys)
+            video_keys = set(map(self.get_video_key_for_heatmap, keys))
 
             logger.info(
-                f"Found {len(heatmap_files)} heatmap files with prefix '{full_prefix}'")
-            return heatmap_files
+                f"Found {len(video_keys)} heatmap files with prefix '{full_prefix}'")
+            self._cache_listing(cache_key, full_prefix, frozenset(video_keys))
+            return video_keys
 
         except ClientError as e:
             logger.error(f"Error listing heatmaps: {e}")
             raise
 
+    def _get_cached_listing(self, cache_key: tuple):
+        """Return a cached listing result younger than LIST_CACHE_TTL, or None."""
+        cached = self._list_cache.get(cache_key)
+        if cached is not None and cached[0] > time.monotonic():
+            logger.debug(f"Using cached listing for '{cached[1]}'")
+            return cached[2]
+        return None
+
+    def _cache_listing(self, cache_key: tuple, prefix: str, result):
+        """Store an immutable listing result for the prefix it covers."""
+        self._list_cache[cache_key] = (time.monotonic() + LIST_CACHE_TTL, prefix, result)
+
+    def _invalidate_listings(self, s3_key: str):
+        """Drop cached listings whose prefix covers a key that just changed."""
+        for cache_key, (_, prefix, _) in list(self._list_cache.items()):
+            if s3_key.startswith(prefix):
+                # pop: concurrent uploads may invalidate the same entry
+                self._list_cache.pop(cache_key, None)
+
+    def _iter_keys(self, prefix: str, start_after: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield object keys under a prefix straight from the paginator.
+
+        Only one page of results is held in memory at a time.
+
+        Args:
+            prefix: S3 key prefix to list
+            start_after: Optional key; S3 only returns keys sorting after it
+
+        Yields:
+            S3 object keys
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+
+        params = {'Bucket': self.bucket_name, 'Prefix': prefix,
+                  'PaginationConfig': {'PageSize': LIST_PAGE_SIZE}}
+        if start_after:
+            params['StartAfter'] = start_after
+
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', ()):
+                yield obj['Key']
+
+    def _list_level(self, prefix: str) -> Tuple[List[str], List[str]]:
+        """
+        List one level of the key hierarchy under a prefix.
+
+        Args:
+            prefix: S3 key prefix ending in '/'
+
+        Returns:
+            Tuple of (keys directly under the prefix, sub-prefixes)
+        """
+        keys = []
+        sub_prefixes = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/',
+                                       PaginationConfig={'PageSize': LIST_PAGE_SIZE}):
+            keys.extend(obj['Key'] for obj in page.get('Contents', ()))
+            sub_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', ()))
+
+        return keys, sub_prefixes
+
+    def _list_keys_parallel(self, prefix: str) -> List[str]:
+        """
+        List every key under a prefix using concurrent paginators.
+
+        The prefix is expanded one '/' level at a time (e.g. year, month, day)
+        until there are at least LIST_MAX_WORKERS sub-prefixes or
+        LIST_FANOUT_DEPTH levels; each sub-prefix is then paginated on its own
+        thread. All threads share the (thread-safe) boto3 client.
+
+        Args:
+            prefix: S3 key prefix to list
+
+        Returns:
+            Keys in S3 (lexicographic) order
+        """
+        keys = []
+        prefixes = [prefix]
+
+        with ThreadPoolExecutor(max_workers=LIST_MAX_WORKERS) as executor:
+            for _ in range(LIST_FANOUT_DEPTH):
+                if len(prefixes) >= LIST_MAX_WORKERS:
+                    break
+                sub_prefixes = []
+                for level_keys, level_prefixes in executor.map(self._list_level, prefixes):
+                    keys.extend(level_keys)
+                    sub_prefixes.extend(level_prefixes)
+                prefixes = sub_prefixes
+
+            for chunk in executor.map(lambda p: list(self._iter_keys(p)), prefixes):
+                keys.extend(chunk)
+
+        # Sub-prefix results arrive grouped by level; code point order of str
+        # matches the UTF-8 byte order S3 uses
+        keys.sort()
+        return keys
+
+    def _list_partitioned(self, date_prefix: str = "",
+                          extension: str = ".mp4") -> Tuple[List[str], Set[str]]:
+        """
+        List videos and heatmaps in a single paginated pass.
+
+        Paginates once under the common parent of the videos and heatmaps
+        prefixes and dispatches each key as it arrives: videos into a list,
+        heatmaps straight into the set of video keys they were made from.
+
+        Args:
+            date_prefix: Optional date prefix to filter files (e.g., "2025/10/")
+            extension: Video file extension to filter by (default: .mp4)
+
+        Returns:
+            Tuple of (video keys, video keys that have a heatmap)
+        """
+        videos_prefix = f"{self.videos_prefix}{date_prefix}"
+        heatmaps_prefix = f"{self.heatmaps_prefix}{date_prefix}"
+        common_prefix = os.path.commonprefix([videos_prefix, heatmaps_prefix])
+        cache_key = ('partitioned', common_prefix, videos_prefix, heatmaps_prefix, extension)
+        cached = self._get_cached_listing(cache_key)
+        if cached is not None:
+            return list(cached[0]), set(cached[1])
+
+        try:
+            video_files = []
+            heatmap_video_keys = set()
+            # Bound locals keep the per-key loop free of attribute lookups
+            is_heatmap = _HEATMAP_PATTERN.search
+            to_video_key = self.get_video_key_for_heatmap
+
+            for key in self._iter_keys(common_prefix):
+                if is_heatmap(key):
+                    if key.startswith(heatmaps_prefix):
+                        heatmap_video_keys.add(to_video_key(key, extension))
+                elif key.endswith(extension) and key.startswith(videos_prefix):
+                    video_files.append(key)
+
+            logger.info(
+                f"Found {len(video_files)} video files and {len(heatmap_video_keys)} heatmap files "
+                f"with prefix '{common_prefix}'")
+            self._cache_listing(cache_key, common_prefix,
+                                (tuple(video_files), frozenset(heatmap_video_keys)))
+            return video_files, heatmap_video_keys
+
+        except ClientError as e:
+            logger.error(f"Error listing videos and heatmaps: {e}")
+            raise
+
     def get_videos_without_heatmaps(self, date_prefix: str = "") -> List[str]:
         """
         Find all videos that don't have corresponding heatmaps.
@@ -122,21 +398,21 @@ class S3Manager:
         Returns:
             List of S3 keys for videos without heatmaps
         """
-        videos = self.list_videos(date_prefix)
-        heatmaps = self.list_heatmaps(date_prefix)
-
-        # Extract video paths from heatmaps
         # Convert: heatmaps/2025/10/20/video_heatmap.jpg -> raw_videos/2025/10/20/video.mp4
-        heatmap_video_keys = set()
-        for heatmap_key in heatmaps:
-            # Remove heatmaps prefix and get the relative path
-            relative_path = heatmap_key.replace(self.heatmaps_prefix, '', 1)
-            # Remove _heatmap suffix and replace extension
-            relative_path = relative_path.replace(
-                '_heatmap.jpg', '.mp4').replace('_heatmap.png', '.mp4')
-            # Add videos prefix
-            video_key = f"{self.videos_prefix}{relative_path}"
-            heatmap_video_keys.add(video_key)
+        if self._prefixes_overlap:
+            # Shared tree: one pass and classify each key client-side
+            videos, heatmap_video_keys = self._list_partitioned(date_prefix)
+        else:
+            # Disjoint trees: let S3 filter by prefix so no key is listed twice,
+            # and list both trees concurrently. Build the client first so the
+            # two threads don't both trigger its creation.
+            self.s3_client
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                videos_future = executor.submit(self.list_videos, date_prefix)
+                heatmaps_future = executor.submit(
+                    self.heatmap_video_keys, date_prefix)
+                videos = videos_future.result()
+                heatmap_video_keys = heatmaps_future.result()
 
         # Find videos without heatmaps
         videos_without_heatmaps = [
@@ -158,11 +434,15 @@ class S3Manager:
             True if successful, False otherwise
         """
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            # Create directory if it doesn't exist (once per directory per process)
+            local_dir = os.path.dirname(local_path)
+            if local_dir not in self._created_dirs:
+                os.makedirs(local_dir, exist_ok=True)
+                self._created_dirs.add(local_dir)
 
             logger.info(f"Downloading {s3_key} to {local_path}")
-            self.s3_client.download_file(self.bucket_name, s3_key, local_path)
+            self.s3_client.download_file(
+                self.bucket_name, s3_key, local_path, Config=self._transfer_config)
             logger.info(f"Successfully downloaded {s3_key}")
             return True
 
@@ -170,6 +450,27 @@ class S3Manager:
             logger.error(f"Error downloading {s3_key}: {e}")
             return False
 
+    def download_files(self, downloads: List[Tuple[str, str]],
+                       max_workers: int = BATCH_TRANSFER_WORKERS) -> List[bool]:
+        """
+        Download several files concurrently.
+
+        Each file is itself fetched with parallel ranged GETs, so a few
+        workers are enough to saturate the connection pool.
+
+        Args:
+            downloads: (s3_key, local_path) pairs
+            max_workers: Number of files downloaded at once
+
+        Returns:
+            Success flag per pair, in input order
+        """
+        if not downloads:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(downloads))) as executor:
+            return list(executor.map(lambda item: self.download_file(*item), downloads))
+
     def upload_file(self, local_path: str, s3_key: str, content_type: Optional[str] = None) -> bool:
         """
         Upload a file from local storage to S3.
@@ -189,7 +490,11 @@ class S3Manager:
 
             logger.info(f"Uploading {local_path} to {s3_key}")
             self.s3_client.upload_file(
-                local_path, self.bucket_name, s3_key, ExtraArgs=extra_args)
+                local_path, self.bucket_name, s3_key, ExtraArgs=extra_args,
+                Config=self._transfer_config)
+            with self._head_cache_lock:
+                self._head_cache.pop(s3_key, None)
+            self._invalidate_listings(s3_key)
             logger.info(f"Successfully uploaded {s3_key}")
             return True
 
@@ -197,6 +502,35 @@ class S3Manager:
             logger.error(f"Error uploading {local_path}: {e}")
             return False
 
+    def upload_files(self, uploads: List[Tuple[str, str]],
+                     max_workers: int = BULK_UPLOAD_WORKERS) -> List[bool]:
+        """
+        Upload many files concurrently.
+
+        Content types are guessed from each file's extension (e.g. '.jpg'
+        -> 'image/jpeg').
+
+        Args:
+            uploads: (local_path, s3_key) pairs
+            max_workers: Number of files uploaded at once
+
+        Returns:
+            Success flag per pair, in input order
+        """
+        if not uploads:
+            return []
+
+        def upload(item: Tuple[str, str]) -> bool:
+            local_path, s3_key = item
+            content_type = mimetypes.guess_type(local_path)[0]
+            return self.upload_file(local_path, s3_key, content_type)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(uploads))) as executor:
+            results = list(executor.map(upload, uploads))
+
+        logger.info(f"Uploaded {sum(results)}/{len(uploads)} files")
+        return results
+
     def file_exists(self, s3_key: str) -> bool:
         """
         Check if a file exists in S3.
@@ -207,11 +541,79 @@ class S3Manager:
         Returns:
             True if file exists, False otherwise
         """
+        return self._head(s3_key) is not None
+
+    def files_exist(self, s3_keys: List[str]) -> Dict[str, bool]:
+        """
+        Check whether several files exist in S3 with a single listing.
+
+        Lists the common prefix of the keys once and checks membership,
+        instead of one HEAD request per key. Falls back to file_exists for a
+        single key, for keys sharing no directory (the listing would cover
+        the whole bucket), if the listing would take more requests than the
+        HEADs it replaces, or if the listing fails.
+
+        Args:
+            s3_keys: S3 object keys to check
+
+        Returns:
+            Mapping of each key to whether it exists
+        """
+        wanted = set(s3_keys)
+        common_prefix = os.path.commonprefix(list(wanted))
+        if len(wanted) <= 1 or '/' not in common_prefix:
+            return {key: self.file_exists(key) for key in s3_keys}
+
+        # One listing page per key is the break-even point with HEADs
+        max_listed = len(wanted) * LIST_PAGE_SIZE
+        found = set()
         try:
-            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-            return True
-        except ClientError:
-            return False
+            for listed, key in enumerate(self._iter_keys(common_prefix), 1):
+                if key in wanted:
+                    found.add(key)
+                    if len(found) == len(wanted):
+                        break
+                elif listed > max_listed:
+                    logger.debug("Listing under %s too large, using HEAD", common_prefix)
+                    return {key: key in found or self.file_exists(key) for key in s3_keys}
+        except ClientError as e:
+            logger.warning(f"Listing for existence check failed, using HEAD: {e}")
+            return {key: self.file_exists(key) for key in s3_keys}
+
+        return {key: key in found for key in s3_keys}
+
+    def _head(self, s3_key: str) -> Optional[int]:
+        """
+        HEAD an object, reusing results younger than HEAD_CACHE_TTL.
+
+        Missing objects are cached too; other errors (e.g. throttling) are not.
+
+        Args:
+            s3_key: S3 object key
+
+        Returns:
+            Object size in bytes, or None if it doesn't exist or the HEAD failed
+        """
+        now = time.monotonic()
+        cached = self._head_cache.get(s3_key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        try:
+            response = self.s3_client.head_object(
+                Bucket=self.bucket_name, Key=s3_key)
+            size = response['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            size = None
+
+        with self._head_cache_lock:
+            if len(self._head_cache) >= HEAD_CACHE_MAXSIZE:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._head_cache.pop(next(iter(self._head_cache)), None)
+            self._head_cache[s3_key] = (now + HEAD_CACHE_TTL, size)
+        return size
 
     def get_heatmap_key_for_video(self, video_key: str, extension: str = ".jpg") -> str:
         """
@@ -231,18 +633,27 @@ class S3Manager:
         # Add heatmaps prefix
         return f"{self.heatmaps_prefix}{base_path}_heatmap{extension}"
 
-    @staticmethod
-    def _is_heatmap(key: str) -> bool:
+    def get_video_key_for_heatmap(self, heatmap_key: str, extension: str = ".mp4") -> str:
         """
-        Check if a key represents a heatmap file.
+        Generate the S3 key of the video a heatmap was generated from.
 
         Args:
-            key: S3 object key
+            heatmap_key: S3 key of the heatmap (e.g., heatmaps/2025/10/20/video_heatmap.jpg)
+            extension: Extension of the video file (default: .mp4)
 
         Returns:
-            True if key represents a heatmap, False otherwise
+            S3 key for the video file (e.g., raw_videos/2025/10/20/video.mp4)
         """
-        return '_heatmap.' in key.lower()
+        # Remove heatmaps_prefix to get relative path
+        relative_path = heatmap_key
+        if relative_path.startswith(self.heatmaps_prefix):
+            relative_path = relative_path[len(self.heatmaps_prefix):]
+        # Remove extension and _heatmap suffix
+        base_path = os.path.splitext(relative_path)[0]
+        if base_path[-len('_heatmap'):].lower() == '_heatmap':
+            base_path = base_path[:-len('_heatmap')]
+        # Add videos prefix
+        return f"{self.videos_prefix}{base_path}{extension}"
 
     def get_file_size(self, s3_key: str) -> Optional[int]:
         """
@@ -254,9 +665,4 @@ class S3Manager:
         Returns:
             File size in bytes, or None if file doesn't exist
         """
-        try:
-            response = self.s3_client.head_object(
-                Bucket=self.bucket_name, Key=s3_key)
-            return response['ContentLength']
-        except ClientError:
-            return None
+        return self._head(s3_key)
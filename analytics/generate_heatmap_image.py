@@ -24,7 +24,7 @@ from db_client import DatabaseClient
 from db_helpers import S3Manager
 from heatmap_writer import HeatmapWriter, HeatmapVisualizer
 from heatmap_helpers import get_reference_frame
-import config
+from config import CFG, ensure_directories
 
 
 def parse_datetime(date_string: str) -> datetime:
@@ -46,7 +46,7 @@ def parse_datetime(date_string: str) -> datetime:
 
 def download_video_for_background(s3_manager: S3Manager, video_path: str) -> Path:
     """Download a video to get a reference frame."""
-    local_path = Path(config.LOCAL_DOWNLOADS_DIR) / Path(video_path).name
+    local_path = Path(CFG.LOCAL_DOWNLOADS_DIR) / Path(video_path).name
 
     if not local_path.exists():
         print(f"Downloading video for background frame: {video_path}")
@@ -117,7 +117,7 @@ def main():
         '--colormap',
         type=str,
         default='jet',
-        help='Matplotlib colormap (default: jet)'
+        help='OpenCV colormap, e.g. jet, turbo, inferno (default: jet)'
     )
     parser.add_argument(
         '--alpha',
@@ -135,8 +135,8 @@ def main():
     if args.with_background and not args.video_path:
         parser.error("--video-path is required when using --with-background")
 
-    # Calculate time range
-    now = datetime.now()
+    # Calculate time range (timezone-aware so it compares directly with TIMESTAMPTZ)
+    now = datetime.now().astimezone()
 
     if args.hours:
         end_time = now
@@ -160,11 +160,11 @@ def main():
     # Connect to database
     print("Connecting to database...")
     db = DatabaseClient(
-        host=config.DB_HOST,
-        port=config.DB_PORT,
-        dbname=config.DB_NAME,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD
+        host=CFG.DB_HOST,
+        port=CFG.DB_PORT,
+        dbname=CFG.DB_NAME,
+        user=CFG.DB_USER,
+        password=CFG.DB_PASSWORD
     )
 
     writer = HeatmapWriter(db, camera_id=args.camera_id)
@@ -194,12 +194,12 @@ def main():
 
         # Initialize S3 manager
         s3_manager = S3Manager(
-            endpoint_url=config.S3_ENDPOINT_URL,
-            access_key=config.S3_ACCESS_KEY,
-            secret_key=config.S3_SECRET_KEY,
-            bucket_name=config.S3_BUCKET_NAME,
-            videos_prefix=config.S3_VIDEOS_PREFIX,
-            heatmaps_prefix=config.S3_HEATMAPS_PREFIX
+            endpoint_url=CFG.S3_ENDPOINT_URL,
+            access_key=CFG.S3_ACCESS_KEY,
+            secret_key=CFG.S3_SECRET_KEY,
+            bucket_name=CFG.S3_BUCKET_NAME,
+            videos_prefix=CFG.S3_VIDEOS_PREFIX,
+            heatmaps_prefix=CFG.S3_HEATMAPS_PREFIX
         )
 
         # Download video if needed
@@ -215,7 +215,7 @@ def main():
 
     # Generate image
     print(f"Generating image: {args.output}")
-    config.ensure_directories()
+    ensure_directories()
 
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
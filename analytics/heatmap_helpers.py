@@ -6,9 +6,16 @@ import cv2
 import numpy as np
 from pathlib import Path
 from typing import Optional
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
+
+from heatmap_processor import accumulate_mask
+
+# Width of images saved without a reference frame (height keeps the aspect ratio)
+DEFAULT_IMAGE_WIDTH = 1920
+JPEG_QUALITY = 90
+
+# 1D Gaussian kernel (51 taps, sigma derived from size) applied separably along
+# both axes; built once instead of on every save
+_BLUR_KERNEL = cv2.getGaussianKernel(51, 0, cv2.CV_32F)
 
 
 def generate_heatmap(video_path: Path, downscale: float = 0.25) -> Optional[np.ndarray]:
@@ -28,7 +35,9 @@ def generate_heatmap(video_path: Path, downscale: float = 0.25) -> Optional[np.n
         return None
 
     h, w = frame.shape[:2]
-    heatmap = np.zeros((int(h*downscale), int(w*downscale)), dtype=np.float32)
+    small_h, small_w = int(h*downscale), int(w*downscale)
+    # Masks are 0/255 uint8: sum them as integers and scale once at the end
+    heatmap = np.zeros((small_h, small_w), dtype=np.uint32)
     bg_subtractor = cv2.createBackgroundSubtractorMOG2(
         history=500,
         varThreshold=16,
@@ -37,12 +46,11 @@ def generate_heatmap(video_path: Path, downscale: float = 0.25) -> Optional[np.n
 
     while ret:
         fg_mask = bg_subtractor.apply(frame)
-        small = cv2.resize(fg_mask, (0, 0), fx=downscale, fy=downscale)
-        heatmap += small / 255.0
+        accumulate_mask(heatmap, fg_mask)
         ret, frame = cap.read()
 
     cap.release()
-    return heatmap
+    return heatmap.astype(np.float32) * np.float32(1.0 / 255.0)
 
 
 def save_heatmap(heatmap: np.ndarray,
@@ -56,34 +64,44 @@ def save_heatmap(heatmap: np.ndarray,
     Args:
         heatmap: Heatmap array from generate_heatmap
         output_path: Path to save image
-        reference_frame: Optional background frame
-        colormap: Matplotlib colormap name
+        reference_frame: Optional background frame (BGR)
+        colormap: OpenCV colormap name (e.g. 'jet', 'turbo', 'inferno')
         alpha: Transparency (0-1)
+
+    Raises:
+        ValueError: If the colormap name is unknown
+        IOError: If the image could not be written
     """
-    # Normalize
-    if heatmap.max() > 0:
-        normalized = heatmap / heatmap.max()
-    else:
-        normalized = heatmap
+    colormap_id = getattr(cv2, f'COLORMAP_{colormap.upper()}', None)
+    if colormap_id is None:
+        raise ValueError(f"Unknown colormap: {colormap}")
 
-    # Apply gaussian blur
-    blurred = cv2.GaussianBlur(normalized, (51, 51), 0)
+    heatmap = np.asarray(heatmap, dtype=np.float32)
 
-    # Create figure
-    fig, ax = plt.subplots(figsize=(16, 9), dpi=150)
+    # Blur into one float32 intermediate, then stretch the blurred range to
+    # 0-255 the way imshow's autoscaling did (the blur flattens peaks, so the
+    # scale can only come from the blurred array, not the raw peak)
+    blurred = cv2.sepFilter2D(heatmap, cv2.CV_32F, _BLUR_KERNEL, _BLUR_KERNEL)
+    intensity = cv2.normalize(blurred, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
 
-    # Background frame if provided
+    # Scale to the output size before colouring, so interpolation happens on
+    # intensities rather than between colormap colours
     if reference_frame is not None:
-        ax.imshow(cv2.cvtColor(reference_frame, cv2.COLOR_BGR2RGB))
+        height, width = reference_frame.shape[:2]
+    else:
+        width = DEFAULT_IMAGE_WIDTH
+        height = round(intensity.shape[0] * width / intensity.shape[1])
+    intensity = cv2.resize(intensity, (width, height), interpolation=cv2.INTER_LINEAR)
+    colored = cv2.applyColorMap(intensity, colormap_id)
 
-    # Overlay heatmap
-    ax.imshow(blurred, cmap=colormap, alpha=alpha, interpolation='bilinear')
-    ax.axis('off')
+    # Overlay on the background frame if provided
+    if reference_frame is not None:
+        image = cv2.addWeighted(reference_frame, 1 - alpha, colored, alpha, 0)
+    else:
+        image = colored
 
-    # Save
-    plt.tight_layout()
-    plt.savefig(output_path, bbox_inches='tight', dpi=150, format='jpg')
-    plt.close(fig)
+    if not cv2.imwrite(str(output_path), image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]):
+        raise IOError(f"Failed to write heatmap image: {output_path}")
 
 
 def get_reference_frame(video_path: Path) -> Optional[np.ndarray]:
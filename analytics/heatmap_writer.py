@@ -5,9 +5,10 @@ Includes serialization/deserialization of numpy arrays.
 
 import numpy as np
 import zlib
+from contextlib import closing
 from typing import List, Optional
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from db_client import DatabaseClient
 from heatmap_processor import HeatmapMinute
@@ -15,57 +16,97 @@ from heatmap_processor import HeatmapMinute
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Batches larger than this are written with binary COPY instead of INSERT
+COPY_ROW_THRESHOLD = 1000
+
+# zlib level for stored arrays; 3 compresses quantized heatmaps ~2x faster
+# than 6 for ~10% larger blobs
+DEFAULT_COMPRESSION_LEVEL = 3
+
 
 class HeatmapWriter:
     """Writes heatmap data to PostgreSQL database."""
 
-    def __init__(self, db_client: DatabaseClient, camera_id: str = 'default'):
+    def __init__(self, db_client: DatabaseClient, camera_id: str = 'default',
+                 quantize: bool = True,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL):
         """
         Initialize heatmap writer.
 
         Args:
             db_client: Database client instance
             camera_id: Camera identifier
+            quantize: Store uint8-quantized arrays (False stores exact float32)
+            compression_level: zlib level (1-9) for stored arrays
         """
         self.db = db_client
         self.camera_id = camera_id
+        self.quantize = quantize
+        self.compression_level = compression_level
 
     @staticmethod
-    def serialize_heatmap(heatmap: np.ndarray) -> bytes:
+    def serialize_heatmap(heatmap: np.ndarray, quantize: bool = True,
+                          level: int = DEFAULT_COMPRESSION_LEVEL) -> bytes:
         """
         Convert numpy array to compressed bytes for database storage.
 
+        By default values are quantized to uint8 relative to the array's
+        maximum, which is stored alongside in the max_intensity column and used
+        to rescale on read. With quantize=False the float32 values are stored
+        as-is (4x larger, lossless).
+
         Args:
             heatmap: 2D numpy array of float32 values
+            quantize: Whether to quantize to uint8
+            level: zlib compression level (1-9)
 
         Returns:
             Compressed bytes
         """
-        # Ensure float32 dtype
-        if heatmap.dtype != np.float32:
-            heatmap = heatmap.astype(np.float32)
+        if quantize:
+            # Quantize to 0-255 against the peak value, reusing one float32
+            # scratch array for the scale/round/clip steps
+            max_value = float(heatmap.max()) if heatmap.size else 0.0
+            if max_value > 0:
+                scaled = np.multiply(heatmap, np.float32(255.0 / max_value),
+                                     dtype=np.float32)
+                np.rint(scaled, out=scaled)
+                np.clip(scaled, 0, 255, out=scaled)
+                stored = scaled.astype(np.uint8, order='C')
+            else:
+                stored = np.zeros(heatmap.shape, dtype=np.uint8)
+        else:
+            # No copy when the array is already C-contiguous float32
+            stored = np.ascontiguousarray(heatmap, dtype=np.float32)
 
-        # Convert to bytes and compress
-        raw_bytes = heatmap.tobytes()
-        # Good balance of speed/compression
-        compressed = zlib.compress(raw_bytes, level=6)
+        # Compress straight from the array's buffer (no tobytes() copy)
+        raw_size = stored.nbytes
+        compressed = zlib.compress(memoryview(stored).cast('B'), level=level)
 
-        # Log compression ratio
-        ratio = (1 - len(compressed) / len(raw_bytes)) * 100
-        logger.debug(
-            f"Compressed {len(raw_bytes)} bytes -> {len(compressed)} bytes ({ratio:.1f}% reduction)")
+        # Log compression ratio (skipped entirely unless debugging; this runs
+        # once per minute)
+        if logger.isEnabledFor(logging.DEBUG):
+            ratio = (1 - len(compressed) / raw_size) * 100
+            logger.debug(
+                "Compressed %d bytes -> %d bytes (%.1f%% reduction)",
+                raw_size, len(compressed), ratio)
 
         return compressed
 
     @staticmethod
-    def deserialize_heatmap(data: bytes, height: int, width: int) -> np.ndarray:
+    def deserialize_heatmap(data: bytes, height: int, width: int,
+                            max_intensity: Optional[float] = None) -> np.ndarray:
         """
         Reconstruct numpy array from database bytes.
 
+        Handles both quantized uint8 arrays and legacy float32 arrays; the
+        format is identified by the decompressed size.
+
         Args:
             data: Compressed bytes from database
             height: Array height
             width: Array width
+            max_intensity: Peak value of the original array (required for uint8 data)
 
         Returns:
             2D numpy array of float32 values
@@ -73,14 +114,26 @@ class HeatmapWriter:
         # Decompress
         decompressed = zlib.decompress(data)
 
-        # Convert back to numpy array
-        heatmap = np.frombuffer(decompressed, dtype=np.float32)
+        if len(decompressed) == height * width:
+            # Quantized uint8: rescale to the original intensity range
+            if max_intensity is None:
+                raise ValueError("max_intensity is required to decode quantized heatmaps")
+            quantized = np.frombuffer(decompressed, dtype=np.uint8)
+            heatmap = quantized.astype(np.float32) * np.float32(max_intensity / 255.0)
+        else:
+            # Legacy float32 array
+            heatmap = np.frombuffer(decompressed, dtype=np.float32)
+
         return heatmap.reshape(height, width)
 
     def write_minute(self, minute: HeatmapMinute, video_path: str, downscale_factor: float) -> bool:
         """
         Write a single minute of heatmap data to the database.
 
+        Unlike write_minutes_batch this does not update the hourly rollups
+        (each refresh re-reads whole hours); callers writing a video minute by
+        minute must call refresh_hourly_rollups(video_path) once afterwards.
+
         Args:
             minute: HeatmapMinute object containing the data
             video_path: S3 key of source video
@@ -91,7 +144,8 @@ class HeatmapWriter:
         """
         try:
             # Serialize the heatmap array
-            intensity_array = self.serialize_heatmap(minute.heatmap)
+            intensity_array = self.serialize_heatmap(minute.heatmap, self.quantize,
+                                                     self.compression_level)
 
             # Get dimensions
             height, width = minute.heatmap.shape
@@ -112,7 +166,7 @@ class HeatmapWriter:
             )
 
             if row_id:
-                logger.debug(f"Wrote minute {minute.timestamp} (id={row_id})")
+                logger.debug("Wrote minute %s (id=%s)", minute.timestamp, row_id)
                 return True
             else:
                 logger.error(f"Failed to write minute {minute.timestamp}")
@@ -127,6 +181,9 @@ class HeatmapWriter:
         """
         Write multiple minutes in batch.
 
+        All minutes go out in one transaction: a single execute_values INSERT
+        for typical videos, or binary COPY for large backfill batches.
+
         Args:
             minutes: List of HeatmapMinute objects
             video_path: S3 key of source video
@@ -135,24 +192,116 @@ class HeatmapWriter:
         Returns:
             Number of successfully written minutes
         """
-        success_count = 0
-
         logger.info(f"Writing {len(minutes)} minutes to database...")
 
+        rows = []
         for minute in minutes:
-            if self.write_minute(minute, video_path, downscale_factor):
-                success_count += 1
+            try:
+                height, width = minute.heatmap.shape
+                intensity_array = self.serialize_heatmap(
+                    minute.heatmap, self.quantize, self.compression_level)
+                rows.append((
+                    self.camera_id, minute.timestamp, video_path, height, width,
+                    downscale_factor, intensity_array,
+                    minute.frame_count, minute.total_intensity,
+                    minute.max_intensity, minute.nonzero_pixels
+                ))
+            except Exception as e:
+                logger.error(f"Error serializing minute {minute.timestamp}: {e}")
+
+        if len(rows) > COPY_ROW_THRESHOLD:
+            success_count = len(self.db.bulk_copy_heatmap_minutes(rows))
+        else:
+            success_count = len(self.db.insert_heatmap_minutes_bulk(rows))
 
         logger.info(
             f"Successfully wrote {success_count}/{len(minutes)} minutes")
 
+        if success_count > 0:
+            self.refresh_hourly_rollups(video_path)
+
         return success_count
 
+    def _add_row(self, aggregated: Optional[np.ndarray], row: dict) -> np.ndarray:
+        """
+        Add one minute or rollup record's decoded array into a float64 running total.
+
+        Args:
+            aggregated: Running total to add into, or None to start one
+            row: Record with intensity_array, height, width and max_intensity
+
+        Returns:
+            The running total
+        """
+        heatmap = self.deserialize_heatmap(
+            row['intensity_array'],
+            row['height'],
+            row['width'],
+            row['max_intensity']
+        )
+        if aggregated is None:
+            return heatmap.astype(np.float64)
+        np.add(aggregated, heatmap, out=aggregated)
+        return aggregated
+
+    def refresh_hourly_rollups(self, video_path: str) -> int:
+        """
+        Recompute the heatmap_hourly rollups for every hour a video touches.
+
+        Each hour is summed again from all of its minutes (not just this video's),
+        so re-processing or overlapping videos can't double count. Concurrent
+        writers are serialized per hour by refresh_hourly_rollup; an hour whose
+        refresh fails loses its rollup and is read minute by minute.
+
+        Args:
+            video_path: S3 key of source video
+
+        Returns:
+            Number of rollups written
+        """
+        def summarize(rows) -> Optional[dict]:
+            summed = None
+            minute_count = frame_count = 0
+            for row in rows:
+                summed = self._add_row(summed, row)
+                minute_count += 1
+                frame_count += row['frame_count']
+                downscale_factor = row['downscale_factor']
+            if summed is None:
+                return None
+
+            summed = summed.astype(np.float32)
+            height, width = summed.shape
+            return {
+                'height': height,
+                'width': width,
+                'downscale_factor': downscale_factor,
+                # Sums exceed uint8 range and get re-added, so keep them exact
+                'intensity_array': self.serialize_heatmap(
+                    summed, quantize=False, level=self.compression_level),
+                'minute_count': minute_count,
+                'frame_count': frame_count,
+                'total_intensity': float(summed.sum()),
+                'max_intensity': float(summed.max()),
+            }
+
+        written = 0
+        for hour in self.db.get_video_hours(video_path):
+            if self.db.refresh_hourly_rollup(self.camera_id, hour, summarize):
+                written += 1
+
+        logger.debug("Refreshed %d hourly rollups for %s", written, video_path)
+        return written
+
     def aggregate_heatmaps(self, start_time: datetime, end_time: datetime,
                            operation: str = 'sum') -> Optional[np.ndarray]:
         """
         Aggregate heatmaps over a time range.
 
+        Full hours with a heatmap_hourly rollup are read as one array each;
+        the remaining minutes (un-rolled hours and partial hours at the range
+        edges) are read individually.
+
         Args:
             start_time: Start of time range
             end_time: End of time range
@@ -162,59 +311,60 @@ class HeatmapWriter:
             Aggregated heatmap array or None if no data
         """
         try:
-            # Get all minutes in range
-            results = self.db.get_heatmap_minutes(
+            if operation not in ('sum', 'mean'):
+                raise ValueError(f"Unknown operation: {operation}")
+
+            # Stream rollups, then the minutes they don't cover, into one running
+            # total (float64, so long ranges don't lose precision)
+            aggregated = None
+            count = 0
+
+            rollups = self.db.iter_hourly_rollups(self.camera_id, start_time, end_time)
+            with closing(rollups):
+                for row in rollups:
+                    aggregated = self._add_row(aggregated, row)
+                    count += row['minute_count']
+
+            minutes = self.db.iter_heatmap_minutes(
                 camera_id=self.camera_id,
                 start_time=start_time,
                 end_time=end_time,
-                include_arrays=True
+                include_arrays=True,
+                skip_rolled_up=True
             )
+            with closing(minutes):
+                for row in minutes:
+                    aggregated = self._add_row(aggregated, row)
+                    count += 1
 
-            if not results:
+            if aggregated is None:
                 logger.warning(
                     f"No data found for range {start_time} - {end_time}")
                 return None
 
-            logger.info(f"Aggregating {len(results)} minutes ({operation})...")
-
-            # Deserialize and aggregate
-            arrays = []
-            for result in results:
-                heatmap = self.deserialize_heatmap(
-                    result['intensity_array'],
-                    result['height'],
-                    result['width']
-                )
-                arrays.append(heatmap)
-
-            # Perform aggregation
-            if operation == 'sum':
-                aggregated = np.sum(arrays, axis=0)
-            elif operation == 'mean':
-                aggregated = np.mean(arrays, axis=0)
-            else:
-                raise ValueError(f"Unknown operation: {operation}")
+            if operation == 'mean':
+                aggregated /= count
+            aggregated = aggregated.astype(np.float32)
 
-            logger.info(f"Aggregated {len(arrays)} arrays using {operation}")
+            logger.info(f"Aggregated {count} arrays using {operation}")
             return aggregated
 
         except Exception as e:
             logger.error(f"Error aggregating heatmaps: {e}")
             return None
 
-    def check_video_processed(self, video_path: str) -> tuple[bool, int]:
-        """Check if video processed and return (processed, minute_count)."""
-        try:
-            with self.db.get_cursor() as cur:
-                cur.execute(
-                    "SELECT COUNT(*) as count FROM heatmap_minutes WHERE video_path = %s",
-                    (video_path,)
-                )
-                count = cur.fetchone()['count']
-                return count > 0, count
-        except Exception as e:
-            logger.error(f"Error checking video: {e}")
-            return False, 0
+    def check_video_processed(self, video_path: str,
+                              count_minutes: bool = False) -> tuple[bool, int]:
+        """
+        Check if video processed and return (processed, minute_count).
+
+        Runs a single query: an EXISTS probe by default, or one COUNT(*) when
+        count_minutes is set (minute_count is 0 unless requested).
+        """
+        if count_minutes:
+            count = self.db.count_video_minutes(video_path)
+            return count > 0, count
+        return self.db.video_has_rows(video_path), 0
 
 
 class HeatmapVisualizer:
@@ -231,38 +381,12 @@ class HeatmapVisualizer:
             heatmap: Heatmap array (can be aggregated from multiple minutes)
             output_path: Path to save image
             reference_frame: Optional background frame
-            colormap: Matplotlib colormap name
+            colormap: OpenCV colormap name (e.g. 'jet', 'turbo', 'inferno')
             alpha: Transparency (0-1)
         """
-        import cv2
-        import matplotlib.pyplot as plt
-        import matplotlib
-        matplotlib.use('Agg')
-
-        # Normalize
-        if heatmap.max() > 0:
-            normalized = heatmap / heatmap.max()
-        else:
-            normalized = heatmap
-
-        # Apply gaussian blur
-        blurred = cv2.GaussianBlur(normalized, (51, 51), 0)
-
-        # Create figure
-        fig, ax = plt.subplots(figsize=(16, 9), dpi=150)
-
-        # Background frame if provided
-        if reference_frame is not None:
-            ax.imshow(cv2.cvtColor(reference_frame, cv2.COLOR_BGR2RGB))
-
-        # Overlay heatmap
-        ax.imshow(blurred, cmap=colormap, alpha=alpha,
-                  interpolation='bilinear')
-        ax.axis('off')
+        from heatmap_helpers import save_heatmap
 
-        # Save
-        plt.tight_layout()
-        plt.savefig(output_path, bbox_inches='tight', dpi=150, format='jpg')
-        plt.close(fig)
+        save_heatmap(heatmap, output_path, reference_frame,
+                     colormap=colormap, alpha=alpha)
 
         logger.info(f"Saved heatmap visualization to {output_path}")
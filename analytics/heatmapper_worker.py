@@ -12,15 +12,16 @@ Can be run on a cron job to continuously process new videos.
 
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, List, Optional
 import logging
 
 from db_helpers import S3Manager
 from db_client import DatabaseClient
 from heatmap_processor import VideoHeatmapProcessor
 from heatmap_writer import HeatmapWriter, HeatmapVisualizer
-import config
+from config import CFG, ensure_directories
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,10 +29,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Videos downloaded ahead of the one being processed (bounds local disk use)
+PREFETCH_DEPTH = 2
+
 
 def download_video(s3_manager: S3Manager, video_key: str) -> Path:
     """Download video from S3 to local storage."""
-    local_path = Path(config.LOCAL_DOWNLOADS_DIR) / Path(video_key).name
+    local_path = Path(CFG.LOCAL_DOWNLOADS_DIR) / Path(video_key).name
     s3_manager.download_file(video_key, str(local_path))
     return local_path
 
@@ -45,27 +49,38 @@ def cleanup_files(*paths: Path):
 
 
 def process_video_to_database(s3_manager: S3Manager, db_client: DatabaseClient,
-                              video_key: str, generate_preview: bool = False) -> bool:
-    """Process video: download → analyze → store in database."""
+                              video_key: str, generate_preview: bool = False,
+                              video_path: Optional[Path] = None,
+                              check_processed: bool = True) -> bool:
+    """Process video: download → analyze → store in database.
+
+    Pass video_path when the video was already downloaded (prefetched), and
+    check_processed=False when the caller already filtered out processed videos.
+    """
     try:
-        processor = VideoHeatmapProcessor(downscale=config.DOWNSCALE)
-        writer = HeatmapWriter(db_client, camera_id=config.CAMERA_ID)
+        processor = VideoHeatmapProcessor(downscale=CFG.DOWNSCALE,
+                                          hw_accel=CFG.VIDEO_HW_ACCELERATION,
+                                          use_cuda=CFG.USE_CUDA)
+        writer = HeatmapWriter(db_client, camera_id=CFG.CAMERA_ID,
+                               quantize=CFG.QUANTIZE_HEATMAPS,
+                               compression_level=CFG.COMPRESSION_LEVEL)
 
         # Check if already processed
-        processed, minute_count = writer.check_video_processed(video_key)
-        if processed:
-            logger.info(
-                f"✓ Skipped (already processed): {video_key} ({minute_count} min)")
+        if check_processed and db_client.video_has_rows(video_key):
+            logger.info(f"✓ Skipped (already processed): {video_key}")
+            if video_path and CFG.CLEANUP_LOCAL_FILES:
+                cleanup_files(video_path)
             return True
 
         # Download and parse timestamp
-        video_path = download_video(s3_manager, video_key)
+        if video_path is None:
+            video_path = download_video(s3_manager, video_key)
         start_time = processor.parse_timestamp_from_filename(
             Path(video_key).name)
 
         if not start_time:
             logger.warning(f"✗ Invalid filename format: {video_key}")
-            cleanup_files(video_path) if config.CLEANUP_LOCAL_FILES else None
+            cleanup_files(video_path) if CFG.CLEANUP_LOCAL_FILES else None
             return False
 
         # Process video
@@ -74,32 +89,35 @@ def process_video_to_database(s3_manager: S3Manager, db_client: DatabaseClient,
 
         if not minutes:
             logger.error("✗ No data generated")
-            cleanup_files(video_path) if config.CLEANUP_LOCAL_FILES else None
+            cleanup_files(video_path) if CFG.CLEANUP_LOCAL_FILES else None
             return False
 
         # Write to database
         success_count = writer.write_minutes_batch(
-            minutes, video_key, config.DOWNSCALE)
+            minutes, video_key, CFG.DOWNSCALE)
 
         # Optional preview
         if generate_preview and minutes:
             try:
                 import numpy as np
-                aggregated = np.sum([m.heatmap for m in minutes], axis=0)
+                # Sum in place rather than stacking the minutes into a temporary
+                aggregated = np.zeros_like(minutes[0].heatmap)
+                for minute in minutes:
+                    np.add(aggregated, minute.heatmap, out=aggregated)
                 reference_frame = None
 
-                if config.USE_BACKGROUND:
+                if CFG.USE_BACKGROUND:
                     from heatmap_helpers import get_reference_frame
                     reference_frame = get_reference_frame(video_path)
 
-                preview_path = Path(config.LOCAL_HEATMAPS_DIR) / \
+                preview_path = Path(CFG.LOCAL_HEATMAPS_DIR) / \
                     f"{video_path.stem}_preview.jpg"
                 HeatmapVisualizer.save_heatmap_image(
                     aggregated, str(preview_path), reference_frame)
             except Exception as e:
                 logger.warning(f"Preview failed: {e}")
 
-        cleanup_files(video_path) if config.CLEANUP_LOCAL_FILES else None
+        cleanup_files(video_path) if CFG.CLEANUP_LOCAL_FILES else None
         logger.info(
             f"✓ Completed: {success_count}/{len(minutes)} minutes written")
         return success_count > 0
@@ -109,33 +127,126 @@ def process_video_to_database(s3_manager: S3Manager, db_client: DatabaseClient,
         return False
 
 
+def create_s3_manager() -> S3Manager:
+    """Build an S3Manager from the configuration."""
+    return S3Manager(
+        endpoint_url=CFG.S3_ENDPOINT_URL,
+        access_key=CFG.S3_ACCESS_KEY,
+        secret_key=CFG.S3_SECRET_KEY,
+        bucket_name=CFG.S3_BUCKET_NAME,
+        videos_prefix=CFG.S3_VIDEOS_PREFIX,
+        heatmaps_prefix=CFG.S3_HEATMAPS_PREFIX
+    )
+
+
+def create_db_client(min_conn: int = CFG.DB_POOL_MIN,
+                     max_conn: int = CFG.DB_POOL_MAX) -> DatabaseClient:
+    """Build a DatabaseClient from the configuration."""
+    # Try connection string first (better for Supabase IPv4 compatibility)
+    if CFG.DB_CONNECTION_STRING:
+        logger.info("Using connection string for database")
+        return DatabaseClient(
+            connection_string=CFG.DB_CONNECTION_STRING,
+            min_conn=min_conn, max_conn=max_conn,
+            prepare_statements=CFG.DB_PREPARE_STATEMENTS)
+
+    logger.info("Using individual DB parameters")
+    return DatabaseClient(
+        host=CFG.DB_HOST, port=CFG.DB_PORT, dbname=CFG.DB_NAME,
+        user=CFG.DB_USER, password=CFG.DB_PASSWORD,
+        min_conn=min_conn, max_conn=max_conn,
+        prepare_statements=CFG.DB_PREPARE_STATEMENTS
+    )
+
+
+# Per-process clients for the process pool (sockets can't be pickled, so each
+# worker process opens its own)
+_process_s3: Optional[S3Manager] = None
+_process_db: Optional[DatabaseClient] = None
+
+
+def _init_worker_process():
+    """Process pool initializer: open this process's S3 and DB clients."""
+    global _process_s3, _process_db
+    _process_s3 = create_s3_manager()
+    # One video at a time per process, so a couple of connections suffice
+    _process_db = create_db_client(min_conn=1, max_conn=2)
+
+
+def _process_video_in_worker(video_key: str, generate_preview: bool) -> bool:
+    """Process pool task: process one video with the per-process clients."""
+    return process_video_to_database(_process_s3, _process_db, video_key,
+                                     generate_preview, check_processed=False)
+
+
+def process_videos_sequential(s3_manager: S3Manager, db_client: DatabaseClient,
+                              videos: List[str],
+                              generate_previews: bool = False) -> Iterator[bool]:
+    """Process videos one at a time, yielding each result in order.
+
+    videos should already exclude processed keys (see run_worker).
+
+    The next few videos are downloaded in the background while the current
+    one is processed, so transfer time overlaps with decode/subtraction time.
+    """
+    downloads = {}
+    with ThreadPoolExecutor(max_workers=PREFETCH_DEPTH) as prefetcher:
+        def prefetch(index: int):
+            if index < len(videos):
+                downloads[index] = prefetcher.submit(
+                    download_video, s3_manager, videos[index])
+
+        for index in range(PREFETCH_DEPTH):
+            prefetch(index)
+
+        for i, video_key in enumerate(videos):
+            prefetch(i + PREFETCH_DEPTH)
+            logger.info(f"[{i + 1}/{len(videos)}] {video_key}")
+
+            try:
+                video_path = downloads.pop(i).result()
+            except Exception as e:
+                logger.error(f"✗ Download failed: {video_key} - {e}")
+                yield False
+                continue
+
+            yield process_video_to_database(s3_manager, db_client, video_key,
+                                            generate_previews, video_path,
+                                            check_processed=False)
+
+
+def process_videos_parallel(videos: List[str], processes: int,
+                            generate_previews: bool = False) -> Iterator[bool]:
+    """Process videos across a pool of worker processes, yielding results in order.
+
+    Each process opens its own S3 and DB clients and downloads its own videos.
+    videos should already exclude processed keys (see run_worker).
+    """
+    processes = min(processes, len(videos))
+    logger.info(f"Using {processes} worker processes")
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_worker_process) as executor:
+        results = executor.map(_process_video_in_worker, videos,
+                               [generate_previews] * len(videos))
+        for i, (video_key, ok) in enumerate(zip(videos, results), 1):
+            logger.info(f"[{i}/{len(videos)}] {video_key}: {'ok' if ok else 'failed'}")
+            yield ok
+
+
 def run_worker(date_prefix: str = "", max_videos: Optional[int] = None,
-               generate_previews: bool = False):
-    """Main worker: scans S3, processes videos, stores in database."""
-    config.ensure_directories()
+               generate_previews: bool = False, rescan: bool = False):
+    """Main worker: scans S3, processes videos, stores in database.
+
+    Unless rescan is set, listing resumes after the camera's worker cursor.
+    """
+    ensure_directories()
 
     # Initialize connections
-    s3_manager = S3Manager(
-        endpoint_url=config.S3_ENDPOINT_URL,
-        access_key=config.S3_ACCESS_KEY,
-        secret_key=config.S3_SECRET_KEY,
-        bucket_name=config.S3_BUCKET_NAME,
-        videos_prefix=config.S3_VIDEOS_PREFIX,
-        heatmaps_prefix=config.S3_HEATMAPS_PREFIX
-    )
+    s3_manager = create_s3_manager()
 
     try:
-        # Try connection string first (better for Supabase IPv4 compatibility)
-        if config.DB_CONNECTION_STRING:
-            logger.info("Using connection string for database")
-            db_client = DatabaseClient(
-                connection_string=config.DB_CONNECTION_STRING)
-        else:
-            logger.info("Using individual DB parameters")
-            db_client = DatabaseClient(
-                host=config.DB_HOST, port=config.DB_PORT, dbname=config.DB_NAME,
-                user=config.DB_USER, password=config.DB_PASSWORD
-            )
+        db_client = create_db_client()
 
         if not db_client.test_connection():
             logger.error("Database connection failed")
@@ -144,10 +255,15 @@ def run_worker(date_prefix: str = "", max_videos: Optional[int] = None,
         logger.error(f"Database error: {e}")
         return
 
-    # Get videos
-    videos = s3_manager.list_videos(date_prefix)
+    # Get videos, skipping those already recorded in the database
+    start_after = None if rescan else db_client.get_worker_cursor(CFG.CAMERA_ID)
+    if start_after:
+        logger.info(f"Listing videos after {start_after}")
+    candidates = s3_manager.list_videos(date_prefix, start_after=start_after)
+    processed = db_client.processed_video_paths(CFG.CAMERA_ID, candidates)
+    videos = [v for v in candidates if v not in processed]
     if not videos:
-        logger.info("No videos found")
+        logger.info("No new videos found")
         db_client.close()
         return
 
@@ -156,12 +272,28 @@ def run_worker(date_prefix: str = "", max_videos: Optional[int] = None,
 
     logger.info(f"Processing {len(videos)} videos...")
 
-    # Process each video
+    if CFG.WORKER_PROCESSES > 1 and len(videos) > 1:
+        results = process_videos_parallel(
+            videos, CFG.WORKER_PROCESSES, generate_previews)
+    else:
+        results = process_videos_sequential(
+            s3_manager, db_client, videos, generate_previews)
+
+    # The cursor only advances over an unbroken run of successes, so a
+    # failed video is listed again next time.
     successful = 0
-    for i, video_key in enumerate(videos, 1):
-        logger.info(f"[{i}/{len(videos)}] {video_key}")
-        if process_video_to_database(s3_manager, db_client, video_key, generate_previews):
+    cursor_key = None
+    cursor_blocked = False
+    for video_key, ok in zip(videos, results):
+        if ok:
             successful += 1
+            if not cursor_blocked:
+                cursor_key = video_key
+        else:
+            cursor_blocked = True
+
+    if cursor_key:
+        db_client.set_worker_cursor(CFG.CAMERA_ID, cursor_key)
 
     # Summary
     stats = db_client.get_database_stats()
@@ -193,6 +325,11 @@ def main():
         action='store_true',
         help='Generate preview images (slower)'
     )
+    parser.add_argument(
+        '--rescan',
+        action='store_true',
+        help='Ignore the stored listing cursor and scan all videos (e.g. for backfills)'
+    )
     parser.add_argument(
         '--stats',
         action='store_true',
@@ -205,18 +342,18 @@ def main():
     if args.stats:
         try:
             # Use connection string for Supabase IPv4 compatibility
-            if config.DB_CONNECTION_STRING:
+            if CFG.DB_CONNECTION_STRING:
                 logger.info("Using connection string for database")
                 db_client = DatabaseClient(
-                    connection_string=config.DB_CONNECTION_STRING)
+                    connection_string=CFG.DB_CONNECTION_STRING)
             else:
                 logger.info("Using individual DB parameters")
                 db_client = DatabaseClient(
-                    host=config.DB_HOST,
-                    port=config.DB_PORT,
-                    dbname=config.DB_NAME,
-                    user=config.DB_USER,
-                    password=config.DB_PASSWORD
+                    host=CFG.DB_HOST,
+                    port=CFG.DB_PORT,
+                    dbname=CFG.DB_NAME,
+                    user=CFG.DB_USER,
+                    password=CFG.DB_PASSWORD
                 )
 
             stats = db_client.get_database_stats()
@@ -238,13 +375,14 @@ def main():
         return
 
     # Run worker
-    max_videos = args.max_videos or config.MAX_VIDEOS_PER_RUN
-    date_prefix = args.date_prefix or config.VIDEO_PREFIX
+    max_videos = args.max_videos or CFG.MAX_VIDEOS_PER_RUN
+    date_prefix = args.date_prefix or CFG.VIDEO_PREFIX
 
     run_worker(
         date_prefix=date_prefix,
         max_videos=max_videos,
-        generate_previews=args.generate_previews
+        generate_previews=args.generate_previews,
+        rescan=args.rescan
     )
 
 
@@ -11,8 +11,98 @@ To hierarchical structure:
 
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple
 from db_helpers import S3Manager
-import config
+from config import CFG
+
+# Concurrent copy requests (each is a server-side copy, so this is latency-bound)
+MIGRATION_WORKERS = 32
+# Objects larger than this can't use a single CopyObject and need multipart copy
+MAX_SINGLE_COPY_SIZE = 5 * 1024 ** 3
+# delete_objects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def list_flat_objects(s3_manager, prefix: str) -> List[Tuple[str, int]]:
+    """
+    List (key, size) for every object under prefix, following pagination.
+
+    Args:
+        s3_manager: S3Manager instance
+        prefix: Key prefix to scan
+
+    Returns:
+        List of (key, size) tuples
+    """
+    paginator = s3_manager.s3_client.get_paginator('list_objects_v2')
+    objects = []
+    for page in paginator.paginate(Bucket=s3_manager.bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            objects.append((obj['Key'], obj['Size']))
+    return objects
+
+
+def move_objects(s3_manager, objects: List[Tuple[str, int]], new_prefix: str) -> Tuple[int, int]:
+    """
+    Move objects under new_prefix: parallel server-side copies, then batched deletes.
+
+    Only objects that copied successfully are deleted.
+
+    Args:
+        s3_manager: S3Manager instance
+        objects: (key, size) tuples to move
+        new_prefix: Prefix prepended to each key
+
+    Returns:
+        (migrated, failed) counts
+    """
+    client = s3_manager.s3_client
+    bucket = s3_manager.bucket_name
+
+    def copy_one(key: str, size: int):
+        source = {'Bucket': bucket, 'Key': key}
+        if size > MAX_SINGLE_COPY_SIZE:
+            client.copy(source, bucket, f"{new_prefix}{key}")
+        else:
+            client.copy_object(Bucket=bucket, CopySource=source,
+                               Key=f"{new_prefix}{key}")
+
+    copied = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=MIGRATION_WORKERS) as executor:
+        futures = {executor.submit(copy_one, key, size): key for key, size in objects}
+        for i, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                future.result()
+                copied.append(key)
+                print(f"[{i}/{len(objects)}] ✓ Copied {key} → {new_prefix}{key}")
+            except Exception as e:
+                failed += 1
+                print(f"[{i}/{len(objects)}] ✗ Error copying {key}: {e}")
+
+    # Delete the originals, up to 1000 keys per request
+    migrated = 0
+    for start in range(0, len(copied), DELETE_BATCH_SIZE):
+        batch = copied[start:start + DELETE_BATCH_SIZE]
+        try:
+            response = client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        except Exception as e:
+            failed += len(batch)
+            print(f"  ✗ Error deleting {len(batch)} originals: {e}")
+            continue
+
+        errors = response.get('Errors', [])
+        for error in errors:
+            print(f"  ✗ Error deleting {error['Key']}: {error.get('Message', error.get('Code'))}")
+        failed += len(errors)
+        migrated += len(batch) - len(errors)
+
+    return migrated, failed
 
 
 def migrate_videos(s3_manager, dry_run=True):
@@ -31,19 +121,15 @@ def migrate_videos(s3_manager, dry_run=True):
     # List all objects that look like videos (start with year pattern)
     print("Scanning for videos in bucket...")
 
-    response = s3_manager.s3_client.list_objects_v2(
-        Bucket=s3_manager.bucket_name,
-        Prefix='2025/'  # Assuming videos start with year
-    )
+    objects = list_flat_objects(s3_manager, '2025/')  # Assuming videos start with year
 
-    if 'Contents' not in response:
+    if not objects:
         print("No videos found to migrate.")
         return 0
 
     videos_to_migrate = []
 
-    for obj in response['Contents']:
-        key = obj['Key']
+    for key, size in objects:
 
         # Skip if already in raw_videos/ or heatmaps/
         if key.startswith('raw_videos/') or key.startswith('heatmaps/'):
@@ -51,7 +137,7 @@ def migrate_videos(s3_manager, dry_run=True):
 
         # Only migrate .mp4 files
         if key.endswith('.mp4'):
-            videos_to_migrate.append(key)
+            videos_to_migrate.append((key, size))
 
     print(f"Found {len(videos_to_migrate)} videos to migrate")
     print()
@@ -62,7 +148,7 @@ def migrate_videos(s3_manager, dry_run=True):
 
     # Show first few examples
     print("Examples:")
-    for video in videos_to_migrate[:5]:
+    for video, _ in videos_to_migrate[:5]:
         new_key = f"raw_videos/{video}"
         print(f"  {video}")
         print(f"  → {new_key}")
@@ -87,33 +173,7 @@ def migrate_videos(s3_manager, dry_run=True):
     print("=" * 60)
     print()
 
-    migrated = 0
-    failed = 0
-
-    for i, old_key in enumerate(videos_to_migrate, 1):
-        new_key = f"raw_videos/{old_key}"
-
-        try:
-            # Copy to new location
-            print(f"[{i}/{len(videos_to_migrate)}] Copying {old_key}...")
-            s3_manager.s3_client.copy_object(
-                Bucket=s3_manager.bucket_name,
-                CopySource={'Bucket': s3_manager.bucket_name, 'Key': old_key},
-                Key=new_key
-            )
-
-            # Delete old location
-            s3_manager.s3_client.delete_object(
-                Bucket=s3_manager.bucket_name,
-                Key=old_key
-            )
-
-            migrated += 1
-            print(f"  ✓ Migrated to {new_key}")
-
-        except Exception as e:
-            failed += 1
-            print(f"  ✗ Error: {e}")
+    migrated, failed = move_objects(s3_manager, videos_to_migrate, 'raw_videos/')
 
     print()
     print("=" * 60)
@@ -142,19 +202,15 @@ def migrate_heatmaps(s3_manager, dry_run=True):
     # List all objects that look like heatmaps
     print("Scanning for heatmaps in bucket...")
 
-    response = s3_manager.s3_client.list_objects_v2(
-        Bucket=s3_manager.bucket_name,
-        Prefix='2025/'
-    )
+    objects = list_flat_objects(s3_manager, '2025/')
 
-    if 'Contents' not in response:
+    if not objects:
         print("No heatmaps found to migrate.")
         return 0
 
     heatmaps_to_migrate = []
 
-    for obj in response['Contents']:
-        key = obj['Key']
+    for key, size in objects:
 
         # Skip if already in raw_videos/ or heatmaps/
         if key.startswith('raw_videos/') or key.startswith('heatmaps/'):
@@ -162,7 +218,7 @@ def migrate_heatmaps(s3_manager, dry_run=True):
 
         # Only migrate .jpg files (heatmaps)
         if key.endswith('.jpg') or key.endswith('.jpeg') or key.endswith('.png'):
-            heatmaps_to_migrate.append(key)
+            heatmaps_to_migrate.append((key, size))
 
     print(f"Found {len(heatmaps_to_migrate)} heatmaps to migrate")
     print()
@@ -173,7 +229,7 @@ def migrate_heatmaps(s3_manager, dry_run=True):
 
     # Show first few examples
     print("Examples:")
-    for heatmap in heatmaps_to_migrate[:5]:
+    for heatmap, _ in heatmaps_to_migrate[:5]:
         new_key = f"heatmaps/{heatmap}"
         print(f"  {heatmap}")
         print(f"  → {new_key}")
@@ -195,33 +251,7 @@ def migrate_heatmaps(s3_manager, dry_run=True):
     print("=" * 60)
     print()
 
-    migrated = 0
-    failed = 0
-
-    for i, old_key in enumerate(heatmaps_to_migrate, 1):
-        new_key = f"heatmaps/{old_key}"
-
-        try:
-            # Copy to new location
-            print(f"[{i}/{len(heatmaps_to_migrate)}] Copying {old_key}...")
-            s3_manager.s3_client.copy_object(
-                Bucket=s3_manager.bucket_name,
-                CopySource={'Bucket': s3_manager.bucket_name, 'Key': old_key},
-                Key=new_key
-            )
-
-            # Delete old location
-            s3_manager.s3_client.delete_object(
-                Bucket=s3_manager.bucket_name,
-                Key=old_key
-            )
-
-            migrated += 1
-            print(f"  ✓ Migrated to {new_key}")
-
-        except Exception as e:
-            failed += 1
-            print(f"  ✗ Error: {e}")
+    migrated, failed = move_objects(s3_manager, heatmaps_to_migrate, 'heatmaps/')
 
     print()
     print("=" * 60)
@@ -261,7 +291,7 @@ def main():
     print()
     print("S3 BUCKET STRUCTURE MIGRATION")
     print("=" * 60)
-    print(f"Bucket:  {config.S3_BUCKET_NAME}")
+    print(f"Bucket:  {CFG.S3_BUCKET_NAME}")
     print(f"Mode:    {'EXECUTE' if args.execute else 'DRY RUN'}")
     print("=" * 60)
     print()
@@ -272,10 +302,10 @@ def main():
 
     # Initialize S3 manager
     s3_manager = S3Manager(
-        endpoint_url=config.S3_ENDPOINT_URL,
-        access_key=config.S3_ACCESS_KEY,
-        secret_key=config.S3_SECRET_KEY,
-        bucket_name=config.S3_BUCKET_NAME,
+        endpoint_url=CFG.S3_ENDPOINT_URL,
+        access_key=CFG.S3_ACCESS_KEY,
+        secret_key=CFG.S3_SECRET_KEY,
+        bucket_name=CFG.S3_BUCKET_NAME,
         videos_prefix='',  # Empty for now - we're migrating
         heatmaps_prefix=''
     )
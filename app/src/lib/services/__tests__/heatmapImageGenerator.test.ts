@@ -156,6 +156,47 @@ describe("HeatmapImageGenerator", () => {
 			expect(Buffer.isBuffer(imageBuffer)).toBe(true);
 		});
 
+		it("should decode quantized uint8 heatmaps like their float32 originals", async () => {
+			const width = 2;
+			const height = 2;
+
+			// The Python writer stores round(value * 255 / max) as uint8
+			const floatArray = new Float32Array([0, 10, 20, 30]);
+			const quantizedArray = Uint8Array.from([0, 85, 170, 255]);
+
+			const makeData = (intensityArray: Buffer): AggregatedHeatmapData => ({
+				height,
+				width,
+				records: [
+					{
+						id: 1,
+						camera_id: "default",
+						timestamp: new Date("2025-10-20T14:00:00"),
+						video_path: "raw_videos/2025/10/20/14/clip.mp4",
+						height,
+						width,
+						downscale_factor: 0.25,
+						intensity_array: intensityArray,
+						frame_count: 60,
+						total_intensity: 60,
+						max_intensity: 30,
+						nonzero_pixels: 3,
+						processed_at: new Date("2025-10-20T14:01:00"),
+					},
+				],
+				totalMinutes: 1,
+			});
+
+			const fromFloat = await generateHeatmapImage(
+				makeData(await deflateAsync(Buffer.from(floatArray.buffer)))
+			);
+			const fromQuantized = await generateHeatmapImage(
+				makeData(await deflateAsync(Buffer.from(quantizedArray.buffer)))
+			);
+
+			expect(fromQuantized.equals(fromFloat)).toBe(true);
+		});
+
 		it("should respect quality option", async () => {
 			const width = 2;
 			const height = 2;
@@ -42,16 +42,32 @@ function applyJetColormap(normalized: number): [number, number, number] {
 
 /**
  * Decompress a single heatmap intensity array from the database.
+ *
+ * Arrays are stored either as quantized uint8 (scaled against the row's
+ * max_intensity) or, for older rows, as raw float32; the decompressed size
+ * tells them apart.
  */
 async function decompressHeatmap(
 	compressedData: Buffer,
 	height: number,
-	width: number
+	width: number,
+	maxIntensity: number
 ): Promise<Float32Array> {
 	// Decompress the zlib-compressed data
 	const decompressed = await inflateAsync(compressedData);
+	const size = height * width;
+
+	// Quantized uint8: rescale to the original intensity range
+	if (decompressed.byteLength === size) {
+		const scale = maxIntensity / 255;
+		const float32Array = new Float32Array(size);
+		for (let i = 0; i < size; i++) {
+			float32Array[i] = decompressed[i] * scale;
+		}
+		return float32Array;
+	}
 
-	// Convert to Float32Array
+	// Legacy float32
 	const float32Array = new Float32Array(
 		decompressed.buffer,
 		decompressed.byteOffset,
@@ -59,9 +75,9 @@ async function decompressHeatmap(
 	);
 
 	// Validate dimensions
-	if (float32Array.length !== height * width) {
+	if (float32Array.length !== size) {
 		throw new Error(
-			`Invalid heatmap dimensions: expected ${height * width}, got ${float32Array.length}`
+			`Invalid heatmap dimensions: expected ${size}, got ${float32Array.length}`
 		);
 	}
 
@@ -83,7 +99,8 @@ async function aggregateHeatmaps(
 		const heatmap = await decompressHeatmap(
 			record.intensity_array,
 			height,
-			width
+			width,
+			record.max_intensity
 		);
 		for (let i = 0; i < size; i++) {
 			aggregated[i] += heatmap[i];
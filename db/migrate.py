@@ -6,12 +6,17 @@ Simple migration system that runs SQL files in order.
 Works with both Python workers and TypeScript app (Kysely).
 """
 
+import hashlib
 import os
+import subprocess
 import sys
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2 import errors, sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_INERROR
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -29,19 +34,42 @@ DB_CONFIG = {
     'sslmode': 'require',  # Supabase requires SSL
 }
 
+# Migration files are sent to the server as raw bytes, so they must be UTF-8
+CLIENT_ENCODING = 'UTF8'
+
 MIGRATIONS_DIR = Path(__file__).parent / 'migrations'
 
+# pg_advisory_lock key held while migrating, so concurrent runners take turns
+MIGRATION_LOCK_ID = 727274
+
+# Leading comment line for migrations that can't run inside a transaction block
+NO_TRANSACTION_MARKER = b'-- NO TRANSACTION'
+
+
+def get_database_url() -> str:
+    """DATABASE_URL with SSL required unless it sets its own sslmode."""
+    parts = urlsplit(DATABASE_URL)
+    if not parts.scheme:
+        # key=value connection string rather than a URL
+        if 'sslmode=' in DATABASE_URL:
+            return DATABASE_URL
+        return f"{DATABASE_URL} sslmode=require"
+
+    if 'sslmode' in dict(parse_qsl(parts.query)):
+        return DATABASE_URL
+    # Start the query string if the URL has none yet
+    return f"{DATABASE_URL}{'&' if parts.query else '?'}sslmode=require"
+
 
 def get_connection():
     """Get database connection."""
     try:
         # Try connection string first (preferred for Supabase)
         if DATABASE_URL:
-            conn = psycopg2.connect(
-                DATABASE_URL + '&sslmode=require' if 'sslmode' not in DATABASE_URL else DATABASE_URL)
+            conn = psycopg2.connect(get_database_url(), client_encoding=CLIENT_ENCODING)
             return conn
         else:
-            conn = psycopg2.connect(**DB_CONFIG)
+            conn = psycopg2.connect(**DB_CONFIG, client_encoding=CLIENT_ENCODING)
             return conn
     except psycopg2.OperationalError as e:
         print(f"Error connecting to database: {e}")
@@ -53,6 +81,31 @@ def get_connection():
         sys.exit(1)
 
 
+@contextmanager
+def migration_lock():
+    """Hold the migration advisory lock for the duration of the block.
+
+    The lock lives on its own autocommit connection, so it is held across the
+    per-migration commits and released even if a migration fails (or the
+    process dies, when the session ends).
+    """
+    lock_conn = get_connection()
+    lock_conn.autocommit = True
+    try:
+        with lock_conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            if not cur.fetchone()[0]:
+                print("Waiting for another migration run to finish...")
+                cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        yield
+    finally:
+        try:
+            with lock_conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        finally:
+            lock_conn.close()
+
+
 def create_migrations_table(conn):
     """Create table to track applied migrations."""
     with conn.cursor() as cur:
@@ -61,58 +114,127 @@ def create_migrations_table(conn):
                 id SERIAL PRIMARY KEY,
                 migration_name VARCHAR(255) UNIQUE NOT NULL,
                 applied_at TIMESTAMPTZ DEFAULT NOW()
-            )
+            );
+            -- SHA-256 of the file as applied (NULL for migrations applied before it was added).
+            -- Checked first: even a no-op ADD COLUMN IF NOT EXISTS takes an exclusive lock
+            -- and would wait behind any open transaction that read the table.
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = 'schema_migrations'::regclass
+                      AND attname = 'content_sha256'
+                      AND NOT attisdropped
+                ) THEN
+                    ALTER TABLE schema_migrations ADD COLUMN content_sha256 BYTEA;
+                END IF;
+            END
+            $$;
         """)
     conn.commit()
 
 
-def get_applied_migrations(conn) -> List[str]:
-    """Get list of already applied migrations."""
+def get_migration_names() -> List[str]:
+    """Get the names of all migration files, in the order they should run."""
+    # DirEntry type checks come from the directory listing, so no stat per file
+    with os.scandir(MIGRATIONS_DIR) as entries:
+        return sorted(
+            entry.name[:-len('.sql')] for entry in entries
+            if entry.name.endswith('.sql') and entry.is_file(follow_symlinks=False)
+        )
+
+
+def get_applied_migrations(conn, migration_names: List[str]) -> Dict[str, Optional[bytes]]:
+    """Get which of the given migrations have already been applied, with their hashes."""
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT migration_name FROM schema_migrations ORDER BY migration_name")
-        return [row[0] for row in cur.fetchall()]
+        # One lookup for all candidates instead of reading the whole history
+        cur.execute("""
+            SELECT migration_name, content_sha256
+            FROM schema_migrations
+            WHERE migration_name = ANY(%s)
+        """, (migration_names,))
+        return {name: sha and bytes(sha) for name, sha in cur.fetchall()}
 
 
-def get_pending_migrations(applied: List[str]) -> List[Tuple[str, Path]]:
+def get_changed_migrations(applied: Dict[str, Optional[bytes]]) -> List[str]:
+    """Get applied migrations whose file no longer matches the recorded hash."""
+    return [
+        name for name, sha in sorted(applied.items())
+        if sha is not None
+        and hashlib.sha256((MIGRATIONS_DIR / f'{name}.sql').read_bytes()).digest() != sha
+    ]
+
+
+def get_pending_migrations(migration_names: List[str],
+                           applied: Dict[str, Optional[bytes]]) -> List[Tuple[str, Path]]:
     """Get list of migrations that haven't been applied yet."""
-    all_migrations = sorted(MIGRATIONS_DIR.glob('*.sql'))
-    pending = []
+    return [(name, MIGRATIONS_DIR / f'{name}.sql')
+            for name in migration_names if name not in applied]
 
-    for migration_path in all_migrations:
-        migration_name = migration_path.stem
-        if migration_name not in applied:
-            pending.append((migration_name, migration_path))
 
-    return pending
+def is_non_transactional(script: bytes) -> bool:
+    """Whether the migration's leading comments include the NO TRANSACTION marker."""
+    for line in script.splitlines():
+        line = line.strip()
+        if not line.startswith(b'--'):
+            return False
+        if line == NO_TRANSACTION_MARKER:
+            return True
+    return False
 
 
 def apply_migration(conn, migration_name: str, migration_path: Path):
-    """Apply a single migration."""
+    """Apply a single migration inside the open batch transaction.
+
+    Each migration runs under a savepoint, so a failure only undoes that
+    migration; the caller commits the batch. Migrations marked
+    NO TRANSACTION are applied on their own in autocommit mode instead.
+    """
     print(f"Applying migration: {migration_name}")
 
-    with open(migration_path, 'r') as f:
-        sql = f.read()
+    # Read as bytes: psycopg2 sends bytes queries as-is, with no decode/encode pass
+    script = migration_path.read_bytes()
 
+    savepoint = False
     try:
         with conn.cursor() as cur:
-            # Execute the migration SQL
-            cur.execute(sql)
-
-            # Record that we applied this migration
-            cur.execute(
-                "INSERT INTO schema_migrations (migration_name) VALUES (%s)",
-                (migration_name,)
+            record = cur.mogrify(
+                "INSERT INTO schema_migrations (migration_name, content_sha256) VALUES (%s, %s)",
+                (migration_name, psycopg2.Binary(hashlib.sha256(script).digest()))
             )
 
-        conn.commit()
+            if is_non_transactional(script):
+                # Commit the batch so far, then run the file as a single statement
+                # outside any transaction block (e.g. CREATE INDEX CONCURRENTLY)
+                conn.commit()
+                conn.autocommit = True
+                try:
+                    cur.execute(script)
+                    cur.execute(record)
+                finally:
+                    conn.autocommit = False
+            else:
+                # The savepoint needs its own round-trip: the server parses a
+                # whole query string before running any of it, so a syntax error
+                # in the script would otherwise stop the savepoint being created
+                cur.execute("SAVEPOINT migration")
+                savepoint = True
+                # Migration SQL and bookkeeping row in one round-trip
+                cur.execute(script + b"\n;\n" + record + b";\nRELEASE SAVEPOINT migration")
+
         print(f"✓ Applied: {migration_name}")
         return True
 
     except Exception as e:
-        conn.rollback()
         print(f"✗ Failed: {migration_name}")
         print(f"Error: {e}")
+        if not conn.autocommit and conn.get_transaction_status() == TRANSACTION_STATUS_INERROR:
+            if savepoint:
+                with conn.cursor() as cur:
+                    cur.execute("ROLLBACK TO SAVEPOINT migration")
+            else:
+                conn.rollback()
+                print("Earlier migrations in this run were rolled back too")
         return False
 
 
@@ -123,6 +245,10 @@ def create_database_if_not_exists():
         print("Using managed database (Supabase) - skipping database creation")
         return True
 
+    # The admin connection below would go to this same database, which must exist
+    if DB_CONFIG['dbname'] == 'postgres':
+        return True
+
     try:
         # Connect to postgres database to create our database
         conn = psycopg2.connect(
@@ -135,17 +261,22 @@ def create_database_if_not_exists():
         conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
 
         with conn.cursor() as cur:
-            # Check if database exists
-            cur.execute(
-                "SELECT 1 FROM pg_database WHERE datname = %s",
-                (DB_CONFIG['dbname'],)
-            )
-
-            if not cur.fetchone():
-                print(f"Creating database: {DB_CONFIG['dbname']}")
-                cur.execute(f"CREATE DATABASE {DB_CONFIG['dbname']}")
+            # Just try to create it; the server reports an existing database
+            # (no separate lookup, and no race with a concurrent runner)
+            try:
+                cur.execute(sql.SQL("CREATE DATABASE {}").format(
+                    sql.Identifier(DB_CONFIG['dbname'])))
                 print(f"✓ Database created: {DB_CONFIG['dbname']}")
-            else:
+            except errors.DuplicateDatabase:
+                print(f"Database already exists: {DB_CONFIG['dbname']}")
+            except errors.InsufficientPrivilege:
+                # Users without CREATEDB are refused before the name is checked
+                cur.execute(
+                    "SELECT 1 FROM pg_database WHERE datname = %s",
+                    (DB_CONFIG['dbname'],)
+                )
+                if not cur.fetchone():
+                    raise
                 print(f"Database already exists: {DB_CONFIG['dbname']}")
 
         conn.close()
@@ -157,9 +288,37 @@ def create_database_if_not_exists():
 
 
 def export_schema(conn, output_path: Path):
-    """Export current database schema to a file."""
+    """Export current database schema to a file.
+
+    Uses pg_dump --schema-only for the full DDL; if pg_dump is not installed
+    (or fails, e.g. older than the server), falls back to listing the tables.
+    """
     print(f"Exporting schema to: {output_path}")
 
+    command = ['pg_dump', '--schema-only', '--no-owner', '--no-privileges']
+    env = os.environ.copy()
+    if DATABASE_URL:
+        command += ['--dbname', get_database_url()]
+    else:
+        command += ['--host', DB_CONFIG['host'], '--port', str(DB_CONFIG['port']),
+                    '--username', DB_CONFIG['user'], '--dbname', DB_CONFIG['dbname']]
+        env.update(PGPASSWORD=DB_CONFIG['password'], PGSSLMODE=DB_CONFIG['sslmode'])
+
+    try:
+        with open(output_path, 'wb') as f:
+            subprocess.run(command, stdout=f, stderr=subprocess.PIPE, env=env, check=True)
+        print(f"✓ Schema exported to: {output_path}")
+        return
+    except FileNotFoundError:
+        print("pg_dump not found - exporting table list only")
+    except subprocess.CalledProcessError as e:
+        print(f"pg_dump failed - exporting table list only: {e.stderr.decode().strip()}")
+
+    export_table_list(conn, output_path)
+
+
+def export_table_list(conn, output_path: Path):
+    """Write the names of the public tables to a file."""
     try:
         with conn.cursor() as cur:
             # Get all tables, indexes, and views
@@ -203,41 +362,52 @@ def main():
     print(
         f"Connected to: {DB_CONFIG['user']}@{DB_CONFIG['host']}/{DB_CONFIG['dbname']}")
 
-    # Create migrations tracking table
-    create_migrations_table(conn)
-
-    # Get applied and pending migrations
-    applied = get_applied_migrations(conn)
-    pending = get_pending_migrations(applied)
+    # Only one runner reads and applies migrations at a time; the others wait
+    # and then find them already applied
+    with migration_lock():
+        # Create migrations tracking table
+        create_migrations_table(conn)
 
-    print(f"\nApplied migrations: {len(applied)}")
-    print(f"Pending migrations: {len(pending)}")
+        # Get applied and pending migrations
+        migration_names = get_migration_names()
+        applied = get_applied_migrations(conn, migration_names)
+        pending = get_pending_migrations(migration_names, applied)
 
-    if not pending:
-        print("\n✓ Database is up to date!")
-        conn.close()
-        return
+        print(f"\nApplied migrations: {len(applied)}")
+        for migration_name in get_changed_migrations(applied):
+            print(f"⚠ Changed since it was applied: {migration_name}")
+        print(f"Pending migrations: {len(pending)}")
 
-    # Apply pending migrations
-    print("\n" + "=" * 60)
-    print("APPLYING MIGRATIONS")
-    print("=" * 60)
-
-    for migration_name, migration_path in pending:
-        if not apply_migration(conn, migration_name, migration_path):
-            print("\n✗ Migration failed. Stopping.")
+        if not pending:
+            print("\n✓ Database is up to date!")
             conn.close()
-            sys.exit(1)
+            return
+
+        # Apply pending migrations
+        print("\n" + "=" * 60)
+        print("APPLYING MIGRATIONS")
+        print("=" * 60)
+
+        # All migrations share one transaction (one commit); a failed one is
+        # rolled back to its savepoint and the ones before it are still kept
+        for migration_name, migration_path in pending:
+            if not apply_migration(conn, migration_name, migration_path):
+                conn.commit()
+                print("\n✗ Migration failed. Stopping.")
+                conn.close()
+                sys.exit(1)
 
-    print("\n" + "=" * 60)
-    print(f"✓ Successfully applied {len(pending)} migration(s)")
-    print("=" * 60)
+        conn.commit()
 
-    # Export current schema
-    schema_path = Path(__file__).parent / 'schema.sql'
-    export_schema(conn, schema_path)
+        print("\n" + "=" * 60)
+        print(f"✓ Successfully applied {len(pending)} migration(s)")
+        print("=" * 60)
 
-    conn.close()
+        # Export current schema
+        schema_path = Path(__file__).parent / 'schema.sql'
+        export_schema(conn, schema_path)
+
+        conn.close()
 
 
 if __name__ == '__main__':
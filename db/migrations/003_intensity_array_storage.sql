@@ -0,0 +1,9 @@
+-- Migration 003: Store intensity arrays without TOAST compression
+-- Created: 2025-10-27
+-- Description: intensity_array is already zlib-compressed by the Python writer, so
+-- TOAST's pglz pass only burns CPU on insert and read. EXTERNAL keeps out-of-line
+-- storage but skips the second compression attempt.
+--
+-- Applies to newly written rows; existing rows keep their current storage until rewritten.
+
+ALTER TABLE heatmap_minutes ALTER COLUMN intensity_array SET STORAGE EXTERNAL;
@@ -0,0 +1,16 @@
+-- Migration 004: Covering index for per-camera time range reads
+-- Created: 2025-10-27
+-- Description: The activity stats, latest-timestamp and range queries all filter on
+-- (camera_id, timestamp) and only read the summary columns. Including those columns
+-- in the index lets Postgres answer them with index-only scans instead of visiting
+-- the heap (where the large intensity_array rows live).
+--
+-- The new index has the same key as idx_heatmap_camera_time and is a superset of
+-- idx_heatmap_camera_time_range, so both are dropped to avoid extra write cost.
+
+CREATE INDEX IF NOT EXISTS idx_heatmap_camera_time_covering
+    ON heatmap_minutes (camera_id, timestamp DESC)
+    INCLUDE (frame_count, total_intensity, max_intensity, nonzero_pixels);
+
+DROP INDEX IF EXISTS idx_heatmap_camera_time;
+DROP INDEX IF EXISTS idx_heatmap_camera_time_range;
@@ -0,0 +1,165 @@
+-- Migration 005: Partition heatmap_minutes by month
+-- Created: 2025-10-28
+-- Description: Converts heatmap_minutes into a table range-partitioned on timestamp
+-- (one partition per UTC calendar month). Retention cleanup can then drop whole
+-- partitions instead of DELETE-ing rows, which avoids dead tuples, index churn and
+-- WAL volume, and range queries only touch the months they cover.
+--
+-- Partitioned tables require unique constraints to include the partition key, so the
+-- primary key becomes (id, timestamp). Writers call ensure_heatmap_partitions() before
+-- inserting so that partitions for new months are created on demand.
+
+-- Detach the id sequence and the dependent view from the old table
+ALTER SEQUENCE heatmap_minutes_id_seq OWNED BY NONE;
+DROP VIEW IF EXISTS heatmap_stats;
+
+ALTER TABLE heatmap_minutes RENAME TO heatmap_minutes_unpartitioned;
+
+CREATE TABLE heatmap_minutes (
+    id BIGINT NOT NULL DEFAULT nextval('heatmap_minutes_id_seq'),
+    camera_id VARCHAR(50) NOT NULL DEFAULT 'default',
+    timestamp TIMESTAMPTZ NOT NULL,
+    video_path TEXT NOT NULL,
+    height INT NOT NULL,
+    width INT NOT NULL,
+    downscale_factor REAL NOT NULL DEFAULT 0.25,
+    intensity_array BYTEA NOT NULL,
+    frame_count INT NOT NULL,
+    total_intensity REAL NOT NULL,
+    max_intensity REAL NOT NULL,
+    nonzero_pixels INT NOT NULL,
+    processed_at TIMESTAMPTZ DEFAULT NOW(),
+    retention_days INT DEFAULT 90
+) PARTITION BY RANGE (timestamp);
+
+ALTER TABLE heatmap_minutes ALTER COLUMN intensity_array SET STORAGE EXTERNAL;
+
+-- Create the partition holding the given instant's UTC month (no-op if it exists)
+CREATE OR REPLACE FUNCTION create_heatmap_partition(ts TIMESTAMPTZ)
+RETURNS TEXT AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', ts AT TIME ZONE 'UTC');
+    partition_name TEXT := 'heatmap_minutes_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF heatmap_minutes FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start AT TIME ZONE 'UTC',
+                (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ALTER COLUMN intensity_array SET STORAGE EXTERNAL',
+                partition_name
+            );
+        EXCEPTION
+            -- Another worker created the same partition concurrently
+            WHEN duplicate_table OR unique_violation THEN NULL;
+        END;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Make sure partitions exist for every month touched by the given timestamps
+CREATE OR REPLACE FUNCTION ensure_heatmap_partitions(timestamps TIMESTAMPTZ[])
+RETURNS VOID AS $$
+DECLARE
+    month_ts TIMESTAMPTZ;
+BEGIN
+    FOR month_ts IN
+        SELECT DISTINCT date_trunc('month', t AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        FROM unnest(timestamps) AS t
+    LOOP
+        PERFORM create_heatmap_partition(month_ts);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for existing data plus the current and next month (raw timestamps: the
+-- function truncates to UTC months itself, independent of the session time zone)
+SELECT ensure_heatmap_partitions(
+    ARRAY(SELECT DISTINCT timestamp FROM heatmap_minutes_unpartitioned)
+    || ARRAY[NOW(), NOW() + INTERVAL '1 month']
+);
+
+INSERT INTO heatmap_minutes (
+    id, camera_id, timestamp, video_path, height, width, downscale_factor,
+    intensity_array, frame_count, total_intensity, max_intensity, nonzero_pixels,
+    processed_at, retention_days
+)
+SELECT
+    id, camera_id, timestamp, video_path, height, width, downscale_factor,
+    intensity_array, frame_count, total_intensity, max_intensity, nonzero_pixels,
+    processed_at, retention_days
+FROM heatmap_minutes_unpartitioned;
+
+DROP TABLE heatmap_minutes_unpartitioned;
+
+ALTER SEQUENCE heatmap_minutes_id_seq OWNED BY heatmap_minutes.id;
+
+-- Constraints and indexes (created on every partition)
+ALTER TABLE heatmap_minutes ADD PRIMARY KEY (id, timestamp);
+ALTER TABLE heatmap_minutes ADD CONSTRAINT unique_camera_minute UNIQUE (camera_id, timestamp);
+
+CREATE INDEX idx_heatmap_time ON heatmap_minutes(timestamp DESC);
+CREATE INDEX idx_heatmap_activity ON heatmap_minutes(camera_id, total_intensity DESC);
+CREATE INDEX idx_heatmap_video_path ON heatmap_minutes(video_path);
+CREATE INDEX idx_heatmap_camera_time_covering
+    ON heatmap_minutes (camera_id, timestamp DESC)
+    INCLUDE (frame_count, total_intensity, max_intensity, nonzero_pixels);
+
+-- Recreate the statistics view
+CREATE OR REPLACE VIEW heatmap_stats AS
+SELECT
+    camera_id,
+    DATE_TRUNC('hour', timestamp) as hour,
+    COUNT(*) as minute_count,
+    SUM(total_intensity) as total_activity,
+    AVG(total_intensity) as avg_activity,
+    MAX(max_intensity) as peak_intensity,
+    SUM(frame_count) as total_frames
+FROM heatmap_minutes
+GROUP BY camera_id, DATE_TRUNC('hour', timestamp);
+
+-- Retention: drop partitions that end before the cutoff, then delete the remaining
+-- expired rows from the partition that straddles it
+CREATE OR REPLACE FUNCTION cleanup_old_heatmaps(retention_days INT DEFAULT 90)
+RETURNS TABLE(deleted_count BIGINT) AS $$
+DECLARE
+    cutoff_date TIMESTAMPTZ;
+    rows_deleted BIGINT := 0;
+    partition RECORD;
+    straddling_rows BIGINT;
+BEGIN
+    cutoff_date := NOW() - make_interval(days => retention_days);
+
+    FOR partition IN
+        SELECT c.oid::regclass AS name, GREATEST(c.reltuples, 0)::BIGINT AS row_estimate
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'heatmap_minutes'::regclass
+          AND (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz
+              <= cutoff_date
+    LOOP
+        EXECUTE format('DROP TABLE %s', partition.name);
+        rows_deleted := rows_deleted + partition.row_estimate;
+    END LOOP;
+
+    DELETE FROM heatmap_minutes
+    WHERE timestamp < cutoff_date;
+
+    GET DIAGNOSTICS straddling_rows = ROW_COUNT;
+
+    RETURN QUERY SELECT rows_deleted + straddling_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Comments for documentation
+COMMENT ON TABLE heatmap_minutes IS 'Stores per-minute heatmap intensity data from video analysis (partitioned by month)';
+COMMENT ON COLUMN heatmap_minutes.intensity_array IS 'Compressed numpy array (height x width) of motion intensity values';
+COMMENT ON COLUMN heatmap_minutes.total_intensity IS 'Quick metric for activity level - sum of all intensity values';
+COMMENT ON COLUMN heatmap_minutes.video_path IS 'S3 key of source video for traceability';
+COMMENT ON FUNCTION cleanup_old_heatmaps IS 'Drops monthly partitions (and deletes boundary rows) older than specified days. Counts for dropped partitions are planner estimates.';
+COMMENT ON FUNCTION ensure_heatmap_partitions IS 'Creates any missing monthly partitions for the given timestamps. Call before inserting.';
@@ -0,0 +1,13 @@
+-- Migration 006: Worker listing cursor
+-- Created: 2025-10-29
+-- Description: Records, per camera, the last S3 video key the worker has fully processed.
+-- Video keys are date-ordered (raw_videos/YYYY/MM/DD/...), so incremental runs can list
+-- with StartAfter=last_key instead of re-paginating the whole videos prefix.
+
+CREATE TABLE IF NOT EXISTS worker_cursor (
+    camera_id VARCHAR(50) PRIMARY KEY,
+    last_key TEXT NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE worker_cursor IS 'Last processed S3 video key per camera (StartAfter marker for incremental listing)';
@@ -0,0 +1,63 @@
+-- Migration 007: Hourly heatmap rollups
+-- Created: 2025-10-30
+-- Description: Stores the sum of each camera's minute heatmaps per UTC hour, so range
+-- aggregation reads one blob per full hour instead of up to 60. Rows are (re)computed
+-- by the heatmap writer for every hour a newly written video touches; minutes in hours
+-- without a rollup (or partial hours at range edges) are still read individually.
+
+CREATE TABLE IF NOT EXISTS heatmap_hourly (
+    camera_id VARCHAR(50) NOT NULL,
+    hour TIMESTAMPTZ NOT NULL,
+    height INT NOT NULL,
+    width INT NOT NULL,
+    downscale_factor REAL NOT NULL,
+    intensity_array BYTEA NOT NULL,
+    minute_count INT NOT NULL,
+    frame_count INT NOT NULL,
+    total_intensity REAL NOT NULL,
+    max_intensity REAL NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (camera_id, hour)
+);
+
+ALTER TABLE heatmap_hourly ALTER COLUMN intensity_array SET STORAGE EXTERNAL;
+
+-- Retention: also expire rollups for hours before the cutoff
+CREATE OR REPLACE FUNCTION cleanup_old_heatmaps(retention_days INT DEFAULT 90)
+RETURNS TABLE(deleted_count BIGINT) AS $$
+DECLARE
+    cutoff_date TIMESTAMPTZ;
+    rows_deleted BIGINT := 0;
+    partition RECORD;
+    straddling_rows BIGINT;
+BEGIN
+    cutoff_date := NOW() - make_interval(days => retention_days);
+
+    FOR partition IN
+        SELECT c.oid::regclass AS name, GREATEST(c.reltuples, 0)::BIGINT AS row_estimate
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'heatmap_minutes'::regclass
+          AND (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz
+              <= cutoff_date
+    LOOP
+        EXECUTE format('DROP TABLE %s', partition.name);
+        rows_deleted := rows_deleted + partition.row_estimate;
+    END LOOP;
+
+    DELETE FROM heatmap_minutes
+    WHERE timestamp < cutoff_date;
+
+    GET DIAGNOSTICS straddling_rows = ROW_COUNT;
+
+    DELETE FROM heatmap_hourly
+    WHERE hour < cutoff_date;
+
+    RETURN QUERY SELECT rows_deleted + straddling_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE heatmap_hourly IS 'Per-camera hourly sums of heatmap_minutes (lossless float32 intensity arrays)';
+COMMENT ON COLUMN heatmap_hourly.hour IS 'Start of the UTC hour';
+COMMENT ON COLUMN heatmap_hourly.minute_count IS 'Number of minutes summed into intensity_array (for means)';
+COMMENT ON FUNCTION cleanup_old_heatmaps IS 'Drops monthly partitions (and deletes boundary rows and hourly rollups) older than specified days. Counts for dropped partitions are planner estimates.';
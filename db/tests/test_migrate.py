@@ -0,0 +1,87 @@
+"""
+Tests for the migration runner.
+
+These run against a real PostgreSQL server (the failure modes depend on how it
+parses and executes SQL) and are skipped unless TEST_DATABASE_URL is set. Each
+test works in a throwaway schema, so nothing outside it is touched.
+"""
+
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import migrate  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL', '')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def schema(monkeypatch, tmp_path):
+    """Point the runner at an empty schema and migrations directory."""
+    name = f"migrate_test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {name}")
+
+    separator = '&' if '?' in TEST_DATABASE_URL else '?'
+    monkeypatch.setattr(migrate, 'DATABASE_URL',
+                        f"{TEST_DATABASE_URL}{separator}options=-csearch_path%3D{name}")
+    monkeypatch.setattr(migrate, 'MIGRATIONS_DIR', tmp_path)
+    # Keep the repo's schema.sql untouched
+    monkeypatch.setattr(migrate, 'export_schema', lambda conn, output_path: None)
+
+    yield name
+
+    with admin.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {name} CASCADE")
+    admin.close()
+
+
+def query(schema_name: str, sql: str):
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SET search_path TO {schema_name}")
+            cur.execute(sql)
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def test_syntax_error_keeps_earlier_migrations(schema, tmp_path, capsys):
+    (tmp_path / '001_good.sql').write_text("CREATE TABLE good (x INT);")
+    (tmp_path / '002_broken.sql').write_text("CREATE TABLE partial (x INT);\nCREATE TABEL oops (x INT);")
+
+    with pytest.raises(SystemExit) as exit_info:
+        migrate.main()
+
+    assert exit_info.value.code == 1
+    assert "✗ Failed: 002_broken" in capsys.readouterr().out
+    assert query(schema, "SELECT migration_name FROM schema_migrations") == [('001_good',)]
+    assert query(schema, "SELECT to_regclass('good') IS NOT NULL, to_regclass('partial') IS NULL") \
+        == [(True, True)]
+
+
+def test_runtime_error_keeps_earlier_migrations(schema, tmp_path):
+    (tmp_path / '001_good.sql').write_text("CREATE TABLE good (x INT);")
+    (tmp_path / '002_broken.sql').write_text("CREATE TABLE partial (x INT);\nSELECT 1 / 0;")
+    (tmp_path / '003_after.sql').write_text("CREATE TABLE after (x INT);")
+
+    with pytest.raises(SystemExit):
+        migrate.main()
+
+    assert query(schema, "SELECT migration_name FROM schema_migrations") == [('001_good',)]
+
+    (tmp_path / '002_broken.sql').write_text("CREATE TABLE partial (x INT);")
+    migrate.main()
+
+    assert query(schema, "SELECT migration_name FROM schema_migrations ORDER BY 1") == [
+        ('001_good',), ('002_broken',), ('003_after',)]